@@ -0,0 +1,141 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+class DetailsCache:
+    """Place Details responses kept in a local SQLite file, keyed by place_id."""
+
+    def __init__(self, cache_dir: str, max_age: float = 24 * 60 * 60, max_entries: int = 10000):
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # connection is shared by the details fetch threads, the lock keeps its use serial
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path / 'place_details.sqlite3', check_same_thread=False)
+        with self.connection:
+            # fields is the comma separated field mask the payload was fetched with, '*' for the full payload
+            self.connection.execute('CREATE TABLE IF NOT EXISTS details (place_id TEXT PRIMARY KEY, payload TEXT NOT NULL, '
+                                    'fields TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS details_accessed_at ON details (accessed_at)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def covers(self, cached_fields: str, fields: list | None) -> bool:
+        """Return True if a payload fetched with cached_fields holds every field in 'fields' (None means all)."""
+        if cached_fields == '*':
+            return True
+        return fields is not None and set(fields) <= set(cached_fields.split(','))
+
+    def get(self, place_id: str, fields: list = None) -> dict | None:
+        """Return cached details for place_id, or None if missing, expired or fetched with too few fields."""
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT payload, fields, expires_at FROM details WHERE place_id = ?',
+                                          (place_id,)).fetchone()
+            if row is None or row[2] <= now or not self.covers(row[1], fields):
+                self.misses = self.misses + 1
+                return None
+            self.connection.execute('UPDATE details SET accessed_at = ? WHERE place_id = ?', (now, place_id))
+            self.hits = self.hits + 1
+        return json.loads(row[0])
+
+    def put(self, place_id: str, details: dict, fields: list = None, ttl: float | None = None) -> None:
+        """Store details for place_id for ttl seconds (max_age by default) and evict the least recently used overflow."""
+        now = time.time()
+        ttl = self.max_age if ttl is None else ttl
+        cached_fields = '*' if fields is None else ','.join(sorted(fields))
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO details VALUES (?, ?, ?, ?, ?)',
+                                    (place_id, json.dumps(details), cached_fields, now + ttl, now))
+            self.evict()
+
+    def evict(self) -> None:
+        """Delete expired entries, then the least recently used ones above max_entries."""
+        self.connection.execute('DELETE FROM details WHERE expires_at <= ?', (time.time(),))
+        (count,) = self.connection.execute('SELECT COUNT(*) FROM details').fetchone()
+        if count > self.max_entries:
+            self.connection.execute('DELETE FROM details WHERE place_id IN '
+                                    '(SELECT place_id FROM details ORDER BY accessed_at LIMIT ?)',
+                                    (count - self.max_entries,))
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+# bump when chart or map drawing changes so images cached by older code are not reused
+CHART_CACHE_VERSION = 1
+
+
+def get_chart_key(*parts) -> str:
+    """Return a hash of everything that goes into a chart, its data as well as its kind and style."""
+    content = json.dumps([CHART_CACHE_VERSION, *parts], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class ChartCache:
+    """Rendered charts and maps kept in a local SQLite file, keyed by get_chart_key of their inputs."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = 200 * 1024 * 1024):
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # the map and census stages render on different threads
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(cache_path / 'charts.sqlite3', check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS charts (key TEXT PRIMARY KEY, image BLOB NOT NULL, '
+                                    'size INTEGER NOT NULL, accessed_at REAL NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS charts_accessed_at ON charts (accessed_at)')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached image for key, or None if it was never stored or has been evicted."""
+        with self.lock, self.connection:
+            row = self.connection.execute('SELECT image FROM charts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses = self.misses + 1
+                return None
+            self.connection.execute('UPDATE charts SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self.hits = self.hits + 1
+        return row[0]
+
+    def put(self, key: str, image: bytes) -> None:
+        """Store image under key and evict the least recently used images above max_bytes."""
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?)',
+                                    (key, image, len(image), time.time()))
+            self.evict()
+
+    def evict(self) -> None:
+        """Delete the least recently used images until the rest fit in max_bytes."""
+        (total,) = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM charts').fetchone()
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM charts ORDER BY accessed_at'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total = total - size
+        self.connection.executemany('DELETE FROM charts WHERE key = ?', evicted)
+
+    def close(self) -> None:
+        self.connection.close()
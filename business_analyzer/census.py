@@ -0,0 +1,92 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+CENSUS_URL = 'https://api.census.gov/data'
+CHARAGEGROUPS_URL = f'{CENSUS_URL}/2019/pep/charagegroups'
+# Census returns every value as a string, these columns are decoded to numbers
+INTEGER_COLUMNS = {'POP', 'RACE', 'AGEGROUP', 'SEX', 'HISP', 'DOMESTICMIG', 'INTERNATIONALMIG', 'NETMIG',
+                   'NATURALINC', 'BIRTHS', 'DEATHS'}
+FLOAT_COLUMNS = {'RDOMESTICMIG', 'RINTERNATIONALMIG', 'RNETMIG', 'RNATURALINC', 'RBIRTH', 'RDEATH'}
+
+
+def coerce_column(column: tuple, kind: type) -> list:
+    """Return column converted to kind, values that do not convert (nulls, blanks) become None."""
+    try:
+        return list(map(kind, column))
+    except (TypeError, ValueError):
+        coerced = []
+        for value in column:
+            try:
+                coerced.append(kind(value))
+            except (TypeError, ValueError):
+                coerced.append(None)
+        return coerced
+
+
+def decode_response(text: str) -> dict:
+    """Decode a Census JSON array response (header row, then data rows) into one typed list per header."""
+    header, *rows = json.loads(text)
+    # zip(*rows) turns the rows into columns in one pass
+    columns = zip(*rows) if rows else [()] * len(header)
+    table = {}
+    for name, column in zip(header, columns):
+        if name in INTEGER_COLUMNS:
+            table[name] = coerce_column(column, int)
+        elif name in FLOAT_COLUMNS:
+            table[name] = coerce_column(column, float)
+        else:
+            table[name] = list(column)
+    return table
+
+
+class CensusClient:
+    """United States Census Bureau API requests over one keep-alive session, several at a time."""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max_workers))
+
+    def get_request_data(self, url: str) -> Union[dict, int]:
+        """Access API data and decode it into typed columns, 0 if the request failed."""
+        response = self.session.get(url)
+        if response.status_code == 200:
+            return decode_response(response.text)
+        else:
+            return 0
+
+    def get_many(self, urls: list) -> list:
+        """Return get_request_data for every url in the same order, running up to max_workers at once."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(self.get_request_data, urls))
+
+    def get_populations(self, predicate: str, codes: dict, target_state: int, target_county: int) -> dict:
+        """Return POP for every name in 'codes' where the predicate (RACE, AGEGROUP or SEX) equals its code."""
+        place = f'for=county:{target_county}&in=state:{target_state}'
+        # repeating the predicate asks for every code in one request, the predicate column tells the rows apart
+        code_filter = '&'.join(f'{predicate}={code}' for code in codes.values())
+        logging.info(f'Accessing United States Census Bureau data for {len(codes)} {predicate} codes')
+        data = self.get_request_data(f'{CHARAGEGROUPS_URL}?get=NAME,POP,{predicate}&{code_filter}&{place}')
+        if data != 0:
+            population = dict(zip(data[predicate], data['POP']))
+            if all(code in population for code in codes.values()):
+                return {name: population[code] for name, code in codes.items()}
+
+        logging.info(f'Batched {predicate} query was not answered in full, querying each code')
+        urls = [f'{CHARAGEGROUPS_URL}?get=NAME,POP&{predicate}={code}&{place}' for code in codes.values()]
+        populations = {}
+        for name, data in zip(codes, self.get_many(urls)):
+            populations[name] = data['POP'][0] if data != 0 else data
+        return populations
+
+    def get_all_populations(self, code_sets: dict, target_state: int, target_county: int) -> dict:
+        """Return get_populations for every {predicate: codes} in code_sets, querying the predicates concurrently."""
+        with ThreadPoolExecutor(max_workers=len(code_sets)) as executor:
+            futures = {predicate: executor.submit(self.get_populations, predicate, codes, target_state, target_county)
+                       for predicate, codes in code_sets.items()}
+            return {predicate: future.result() for predicate, future in futures.items()}
@@ -0,0 +1,42 @@
+import numpy as np
+
+from static_map import project
+
+# places closer than this on screen at the map's zoom share a marker
+CLUSTER_PIXELS = 60
+
+
+def get_located(points: list, ratings: list = None) -> tuple:
+    """Returns lat, lng and rating arrays of the points that have a location, rating is NaN where unknown."""
+    if ratings is None:
+        ratings = [None] * len(points)
+    located = [(lat, lng, np.nan if rating in (None, "DNE") else rating)
+               for (lat, lng), rating in zip(points, ratings) if lat not in (None, "DNE") and lng not in (None, "DNE")]
+    if not located:
+        return (np.empty(0), np.empty(0), np.empty(0))
+    lat, lng, rating = np.array(located, dtype=float).T
+    return (lat, lng, rating)
+
+
+def cluster_points(lat: np.ndarray, lng: np.ndarray, rating: np.ndarray, zoom: int,
+                   cell_pixels: int = CLUSTER_PIXELS) -> list:
+    """Groups places into square screen cells at zoom, one pass over the places whatever their number.
+
+    Returns (lat, lng, number of places, average rating or None) per cluster, placed at the mean of its places.
+    """
+    if len(lat) == 0:
+        return []
+    x, y = project(lat, lng, zoom)
+    keys = np.stack(((x // cell_pixels).astype(np.int64), (y // cell_pixels).astype(np.int64)), axis=1)
+    _, cluster = np.unique(keys, axis=0, return_inverse=True)
+    cluster = cluster.reshape(-1)
+
+    counts = np.bincount(cluster)
+    cluster_lat = np.bincount(cluster, weights=lat) / counts
+    cluster_lng = np.bincount(cluster, weights=lng) / counts
+    rated = ~np.isnan(rating)
+    rated_counts = np.bincount(cluster[rated], minlength=len(counts))
+    rating_totals = np.bincount(cluster[rated], weights=rating[rated], minlength=len(counts))
+    return [(float(cluster_lat[index]), float(cluster_lng[index]), int(counts[index]),
+             round(float(rating_totals[index] / rated_counts[index]), 2) if rated_counts[index] else None)
+            for index in range(len(counts))]
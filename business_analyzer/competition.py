@@ -0,0 +1,54 @@
+import numpy as np
+
+from normalize import PlaceTable
+from spatial import DEFAULT_CELL_MILES, SpatialIndex
+
+# the nearest competitors measured around every place
+NEAREST_COMPETITORS = 3
+# a grid cell holding at least this many places counts as saturated
+SATURATED_CELL = 5
+
+
+def get_median(values: np.ndarray) -> float | None:
+    """Returns the median of the known values, None when there are none."""
+    values = values[np.isfinite(values)]
+    return round(float(np.median(values)), 2) if len(values) else None
+
+
+def get_percent(flags: np.ndarray) -> float | None:
+    """Returns the percent of flags that are set, None when there are no flags."""
+    return float(np.count_nonzero(flags) * 100 / len(flags)) if len(flags) else None
+
+
+class AnalyzeCompetition:
+    """Nearest competitor and saturation metrics of the located places, all read off one spatial index.
+
+    Labels carry their unit in brackets, values are None where there are too few located places to measure them.
+    """
+
+    def __init__(self, k: int = NEAREST_COMPETITORS, cell_miles: float = DEFAULT_CELL_MILES,
+                 saturated: int = SATURATED_CELL):
+        self.k = k
+        self.cell_miles = cell_miles
+        self.saturated = saturated
+
+    def competition_report(self, table: PlaceTable, center: tuple) -> dict:
+        """Returns {statistic: value} for how close the places are to the location and to each other."""
+        index = SpatialIndex(table.lat, table.lng, self.cell_miles)
+        located = index.points
+        nearest = index.get_nearest_distances(self.k)[located]
+        from_center = index.get_distances(center)[located]
+        cell_counts = index.get_cell_counts()[located]
+        near = f'{self.cell_miles:g} mi'
+
+        return {
+            'Businesses with a location': len(located),
+            'Closest business to the location (miles)': round(float(from_center.min()), 2) if len(located) else None,
+            f'Businesses within {near} of the location': len(index.query_radius(center, self.cell_miles)),
+            'Median distance to the nearest competitor (miles)': get_median(nearest[:, 0]),
+            f'Median distance to reach {self.k} competitors (miles)': get_median(nearest[:, -1]),
+            f'Businesses with a competitor within {near} (%)': get_percent(nearest[:, 0] <= self.cell_miles),
+            f'Businesses in a {near} square with {self.saturated - 1}+ others (%)':
+                get_percent(cell_counts >= self.saturated),
+            'Peak density (businesses per square mile)': float(index.get_density()[2].max()) if len(located) else None,
+        }
@@ -1,18 +1,20 @@
 import requests
-import ast
 import json
 
+from census import decode_response
+from state_county_index import write_binary_index
+
 def get_request_data(url):
     response = requests.get(url)
     status_code = response.status_code
     if status_code != 204:
-        final = ast.literal_eval(response.text)
+        final = decode_response(response.text)
         return final
     else:
         return 1
 
-def map(array):
-    counties = {(county.split(",")[0]): code for county, state, code in array}
+def map(columns):
+    counties = {(county.split(",")[0]): code for county, code in zip(columns['NAME'], columns['county'])}
     return counties
 
 def create_json():
@@ -24,8 +26,8 @@ def create_json():
     
     all_states = {}
     data_url = f'{base_url}?get=NAME&for=state:*'
-    mapped_state_codes = (get_request_data(data_url))[1:]
-    sorted_data = sorted(mapped_state_codes, key=lambda x: int(x[1]))
+    states = get_request_data(data_url)
+    sorted_data = sorted(zip(states['NAME'], states['state']), key=lambda x: int(x[1]))
 
     all_states = {state_name: {'CODE': state_code, 'COUNTIES': {}} for state_name, state_code in sorted_data}
     
@@ -37,7 +39,7 @@ def create_json():
         if get_request_data(data_url) == 1:
             print('NOT ENOUGH COUNTIES')
         else:
-            counties = get_request_data(data_url)[1:]
+            counties = get_request_data(data_url)
             all_states[state]['COUNTIES'] = map(counties)
     
     file_name = 'state_county_mapping.json'
@@ -46,5 +48,8 @@ def create_json():
         json.dump(all_states, json_file, indent=4)
 
     print('Written to json file.')
+
+    write_binary_index(file_name)
+    print('Written precompiled index.')
         
 create_json()
@@ -1,91 +1,206 @@
+from __future__ import annotations
+
 import time
-import googlemaps
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from math import cos, radians, sqrt
+from typing import TYPE_CHECKING
+
+import numpy as np
 import requests
+from requests.adapters import HTTPAdapter
+
+from cache import DetailsCache
+from place import Place
+from spatial import get_distances_in_miles
 
-def store_all_keys(dictionary: dict, result_dict: dict, parent_key=""):
-    """Format all keys into neater format."""
-    for key, value in dictionary.items():
-        new_key = parent_key + "." + key if parent_key else key
-        result_dict[new_key] = value
-        if isinstance(value, dict):
-            store_all_keys(value, result_dict, new_key)
+# googlemaps is imported when a search starts so the CLI starts without it
+if TYPE_CHECKING:
+    import googlemaps
+
+DETAILS_URL = 'https://maps.googleapis.com/maps/api/place/details/json'
+# a next_page_token only becomes valid a moment after it is issued, so poll it with a growing delay
+NEXT_PAGE_INITIAL_DELAY = 0.5
+NEXT_PAGE_MAX_DELAY = 2.0
+NEXT_PAGE_TIMEOUT = 10.0
+# nearby search never returns more than three pages of 20, a tile that hits this may be missing places
+NEARBY_RESULT_CAP = 60
+MIN_TILE_RADIUS = 250
+METERS_PER_DEGREE = 111320
 
 def get_all_place_ids(data: dict):
     """Return all place ids into a list."""
-    place_ids = []
-    for place in data:
-        if place['place_id'] not in place_ids:
-            place_ids.append(place['place_id'])
+    # dict keeps first-seen order, so the dedupe matches the old list scan
+    place_ids = dict.fromkeys(place['place_id'] for place in data)
+    return list(place_ids)
+
+def create_session(pool_size: int = 1) -> requests.Session:
+    """Return a keep-alive session whose connection pool fits pool_size concurrent requests."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(pool_size, 1))
+    session.mount('https://', adapter)
+    return session
 
-    return place_ids
+def get_details(key, place_id, session: requests.Session = None, cache: DetailsCache = None, fields: list = None):
+    """Return all details for each place, limited to 'fields' when given."""
+    if cache is not None:
+        place_details = cache.get(place_id, fields)
+        if place_details is not None:
+            return place_details
 
-def get_details(key, place_id):
-    """Return all details for each place."""
-    url = f'https://maps.googleapis.com/maps/api/place/details/json?key={key}&place_id={place_id}'
-    response = requests.get(url)
+    params = {'key': key, 'place_id': place_id}
+    if fields is not None:
+        params['fields'] = ','.join(fields)
+    http = session if session is not None else requests
+    response = http.get(DETAILS_URL, params=params)
     data = response.json()
 
     if response.status_code == 200 and data['status'] == 'OK':
         place_details = data['result']
+        if cache is not None:
+            cache.put(place_id, place_details, fields)
         return place_details
     else:
         print('Failed to retrieve place details.')
         return None
 
-def get_place_details_per_place(api_key: str, location: str, radius: int, type: str):
-    """Call Google Places API and get all data."""
+def get_all_details(api_key: str, place_ids: list, workers: int = 1, cache: DetailsCache = None,
+                    fields: list = None) -> list:
+    """Return details for every place id in the same order, fetching up to 'workers' at a time over one session."""
+    with create_session(workers) as session:
+        if workers <= 1:
+            return [get_details(api_key, id, session, cache, fields) for id in place_ids]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map yields results in submission order regardless of completion order
+            return list(executor.map(lambda id: get_details(api_key, id, session, cache, fields), place_ids))
+
+def get_next_page(gmaps: googlemaps.Client, page_token: str) -> tuple:
+    """Return the next page of nearby results, polling until Google accepts the page token, and the calls it took."""
+    import googlemaps
+
+    delay = NEXT_PAGE_INITIAL_DELAY
+    waited = 0.0
+    attempts = 0
+    while True:
+        time.sleep(delay)
+        waited = waited + delay
+        # a rejected token is still a call made
+        attempts = attempts + 1
+        try:
+            return (gmaps.places_nearby(page_token=page_token), attempts)
+        except googlemaps.exceptions.ApiError as error:
+            # INVALID_REQUEST is what Google answers while the token is not live yet
+            if error.status != 'INVALID_REQUEST' or waited >= NEXT_PAGE_TIMEOUT:
+                raise
+        delay = min(delay * 2, NEXT_PAGE_MAX_DELAY)
+
+def get_nearby_places(gmaps: googlemaps.Client, location: str, radius: int, type: str) -> tuple:
+    """Return nearby search results from every page the API returns and the number of API calls spent."""
+    page = gmaps.places_nearby(location=location, radius=radius,
+                               open_now=False, type=type)
+    api_calls = 1
+    results = list(page['results'])
+    while 'next_page_token' in page:
+        page, attempts = get_next_page(gmaps, page['next_page_token'])
+        api_calls = api_calls + attempts
+        results.extend(page['results'])
+
+    return (results, api_calls)
+
+def split_circle(center: tuple, radius: float) -> list:
+    """Return the four sub-circles that cover each quadrant of a circle's bounding square."""
+    lat, lng = center
+    offset = radius / 2
+    lat_offset = offset / METERS_PER_DEGREE
+    lng_offset = offset / (METERS_PER_DEGREE * cos(radians(lat)))
+    sub_radius = radius / sqrt(2)
+    return [((lat + lat_sign * lat_offset, lng + lng_sign * lng_offset), sub_radius)
+            for lat_sign in (1, -1) for lng_sign in (1, -1)]
+
+def get_place_location(place: dict) -> tuple:
+    """Return (lat, lng) of a nearby search result."""
+    location = place['geometry']['location']
+    return (location['lat'], location['lng'])
+
+def get_nearby_places_tiled(gmaps: googlemaps.Client, location: tuple, radius: int, type: str,
+                            min_radius: float = MIN_TILE_RADIUS) -> tuple:
+    """Return nearby results for the whole circle by splitting only saturated tiles, and the number of API calls spent."""
+    places = {}
+    api_calls = 0
+    tiles = [(tuple(location), radius)]
+    while tiles:
+        center, tile_radius = tiles.pop(0)
+        results, calls = get_nearby_places(gmaps, center, round(tile_radius), type)
+        api_calls = api_calls + calls
+
+        # every result of the tile is checked against the search circle at once
+        lat, lng = np.array([get_place_location(place) for place in results], dtype=float).reshape(-1, 2).T
+        in_circle = get_distances_in_miles(location[0], location[1], lat, lng) * 1609 <= radius
+        for place, inside in zip(results, in_circle):
+            if inside and place['place_id'] not in places:
+                places[place['place_id']] = place
+
+        if len(results) < NEARBY_RESULT_CAP:
+            continue
+        if tile_radius / sqrt(2) < min_radius:
+            logging.info(f'Tile at {center} is saturated at minimum radius, some places may be missing')
+            continue
+        sub_tiles = split_circle(center, tile_radius)
+        sub_lat, sub_lng = np.array([sub_center for sub_center, sub_radius in sub_tiles]).T
+        gaps = get_distances_in_miles(location[0], location[1], sub_lat, sub_lng) * 1609
+        # skip sub-circles that fall completely outside the requested search circle
+        tiles.extend(tile for tile, gap in zip(sub_tiles, gaps) if gap - tile[1] < radius)
+
+    return (list(places.values()), api_calls)
+
+def search_places(api_key: str, location: str, radius: int, type: str, tiled: bool = False) -> tuple:
+    """Return nearby search results and the number of API calls spent, tiling the circle if asked."""
+    import googlemaps
+
     gmaps = googlemaps.Client(key=api_key)
-    places = gmaps.places_nearby(location=location, radius=radius,
-                                 open_now=False, type=type)
-    time.sleep(5)
-    next_places = gmaps.places_nearby(page_token=places['next_page_token'])
-    results = places['results']
-    next_results = next_places['results']
-    for place in next_results:
-        results.append(place)
+    if tiled:
+        return get_nearby_places_tiled(gmaps, location, radius, type)
+    return get_nearby_places(gmaps, location, radius, type)
+
+def get_place_summaries(api_key: str, location: str, radius: int, type: str, tiled: bool = False) -> dict:
+    """Return a Place per nearby search record without any Place Details calls."""
+    results, api_calls = search_places(api_key, location, radius, type, tiled)
+    summaries = {}
+    for place in results:
+        if place['place_id'] not in summaries:
+            summaries[place['place_id']] = Place.from_details(place)
+
+    logging.info(f'Found {len(summaries)} places with {api_calls} nearby search calls, skipping details')
+    return summaries
+
+def get_place_details_per_place(api_key: str, location: str, radius: int, type: str, workers: int = 1,
+                                tiled: bool = False, cache: DetailsCache = None, fields: list = None):
+    """Call Google Places API and get all data."""
+    results, api_calls = search_places(api_key, location, radius, type, tiled)
 
     place_ids = get_all_place_ids(results)
+    logging.info(f'Found {len(place_ids)} places with {api_calls} nearby search calls, '
+                 f'fetching details with {len(place_ids)} more')
+
+    all_details = {}
+    for id, details in zip(place_ids, get_all_details(api_key, place_ids, workers, cache, fields)):
+        if details is None:
+            continue
+        all_details[id] = Place.from_details(details)
 
-    all_details = {key: 0 for key in place_ids}
-    for id in place_ids:
-        result = {}
-        details = get_details(api_key, id)
-        store_all_keys(details, result)
-        all_details[id] = result
+    if cache is not None:
+        logging.info(f'Details cache: {cache.hits} hits, {cache.misses} misses')
 
     return all_details
 
-def check_and_add(data, key):
-    """Format data to custom tag for not defined instead of Google defined label."""
-    if key not in data:
-        data[key] = "DNE"
-    return data
-
-def get_unique_keys(list_of_dicts: list) -> list:
-    """Return all unique keys in data."""
-    all_keys = set().union(*list_of_dicts)
-    common_keys = set.intersection(*[set(d.keys()) for d in list_of_dicts])
-    unique_keys = all_keys - common_keys
-    return list(unique_keys)
-
-def standardize_data(data):
-    """Make data uniform by reformatting and cleaning."""
-    lst = [value for key, value in data.items()]
-    adder = get_unique_keys(lst)
-
-    data_copy = {}
-    for place in data:
-        for key in adder:
-            check_and_add(data[place], key)
-        data_copy[place] = data[place]
-
-    return data_copy
-
-def main(api_key: str, location: str, radius: int, type:str):
-    """Main function to get all data and standardize it."""
+def main(api_key: str, location: str, radius: int, type:str, workers: int = 1, tiled: bool = False,
+         cache: DetailsCache = None, fields: list = None, tier: str = 'full'):
+    """Main function to get a Place per business, the 'fast' tier uses nearby search records only."""
     try:
-        details = get_place_details_per_place(api_key, location, radius, type)
-        details_standardized = standardize_data(details)
-        return details_standardized
+        if tier == 'fast':
+            details = get_place_summaries(api_key, location, radius, type, tiled)
+        else:
+            details = get_place_details_per_place(api_key, location, radius, type, workers, tiled, cache, fields)
+        return details
     except KeyError as error:
         print(error)
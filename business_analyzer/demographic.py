@@ -1,60 +1,100 @@
+import io
 import logging
 import os
-import tempfile
-import requests
-import ast
-import json
-from typing import Union
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 
-import matplotlib.pyplot as plt
-logging.basicConfig(level=logging.INFO)
-
-class Demographic:
+from cache import ChartCache, get_chart_key
+from census import CensusClient, CENSUS_URL
+from state_county_index import CodeLookupError, MAPPING_FILE, get_index
 
-    def state_lookup(self, data_lookup_flag: str, target_state: int, target_code: int, file: str) -> Union[int, str]:
-        with open(file, "r") as f:
-            data = json.load(f)
-
-        for state in data:
-            if data_lookup_flag == 'CODE':
-                if state == target_state:
-                    return data[state]['CODE']
-            else:
-                if target_code == data[state]['CODE']:
-                    return state
-        return 1029384756
+logging.basicConfig(level=logging.INFO)
 
-    def county_lookup(self, data_lookup_flag: str, target_state: str, target_county: str, target_code: int, file: str) -> Union[int, str]:
+def save_figure(fig) -> bytes:
+    """Returns a figure as PNG bytes."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png')
+    return buffer.getvalue()
+
+def render_pie_chart(sizes: list, labels: list, legend_labels: list, title: str) -> bytes:
+    # figures are made directly rather than through pyplot, so nothing is left open in pyplot's global state
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 8))
+    ax = fig.add_subplot()
+    ax.pie(sizes, labels=labels, startangle=140)
+    ax.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
+    ax.set_title(title)
+    ax.legend(legend_labels, loc="upper right", bbox_to_anchor=(1.1,1.1))
+    return save_figure(fig)
+
+def render_line_chart(x: list, y: list, ylabel: str, title: str) -> bytes:
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 6))
+    ax = fig.add_subplot()
+    ax.plot(x, y, marker='o', linestyle='-', color='blue')
+    ax.set_xlabel('Year')
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.grid(True)
+    if len(x) == 0:
+        ax.set_ylim(100, -100)
+    return save_figure(fig)
+
+def render_chart(chart: tuple) -> bytes:
+    """Renders a (render function, arguments) chart, module level so worker processes can unpickle it."""
+    function, args = chart
+    return function(*args)
+
+def load_matplotlib(_) -> None:
+    """Import matplotlib in a worker process ahead of its first chart."""
+    import matplotlib.figure
+
+def start_chart_workers(workers: int) -> ProcessPoolExecutor | None:
+    """Start chart worker processes and have them import matplotlib, or None to render in this process."""
+    if workers < 2:
+        return None
+    try:
+        # spawned workers start clean instead of forking the pipeline's threads and open connections
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'))
+        for _ in range(workers):
+            executor.submit(load_matplotlib, None)
+        return executor
+    except (OSError, RuntimeError) as error:
+        logging.info(f'Rendering charts in this process, worker processes failed to start: {error}')
+        return None
+
+def render_charts(charts: list, executor: ProcessPoolExecutor | None = None) -> list:
+    """Renders charts to PNG bytes in the worker processes, in the order given, or in this process without them."""
+    if executor is not None:
+        try:
+            return list(executor.map(render_chart, charts))
+        except (OSError, RuntimeError) as error:
+            logging.info(f'Rendering charts in this process, worker processes failed: {error}')
+    return [render_chart(chart) for chart in charts]
 
-        with open(file, "r") as f:
-            data = json.load(f)
-        counties = data[target_state]['COUNTIES']
+class Demographic:
 
-        for county_name, code in counties.items():
-            if data_lookup_flag == 'CODE':
-                if county_name == target_county:
-                    return code
-            else:
-                if code == target_code:
-                    return county_name
-        return 1029384756
-
-    # done
-    def get_request_data(self, url: str) -> Union[list, int]:
-        """Access API data and interpret it literally to get dict or list."""
-        response = requests.get(url)
-        if response.status_code == 200:
-            final = ast.literal_eval(response.text)
-            return final
-        else:
-            return 0
-    # done - used for getting population of intended api call
-    def get_target_county_population(self, data: list) -> int:
-        """Return population number with given data (same format everytime)"""
-        if not isinstance(data, list):
-            return data
-        else:
-            return data[1:][0][1]
+    def __init__(self, workers: int = 8, chart_workers: int = None, chart_cache: ChartCache = None):
+        self.census = CensusClient(workers)
+        # one process per chart at most, there are six
+        self.chart_workers = chart_workers or min(6, os.cpu_count() or 1)
+        self.chart_cache = chart_cache
+
+    def state_lookup(self, data_lookup_flag: str, target_state: str, target_code: str, file: str) -> str:
+        """Return a state's code ('CODE' flag) or a code's state name, raises CodeLookupError if not found."""
+        index = get_index(file)
+        if data_lookup_flag == 'CODE':
+            return index.get_state_code(target_state)
+        return index.get_state_name(target_code)
+
+    def county_lookup(self, data_lookup_flag: str, target_state: str, target_county: str, target_code: str, file: str) -> str:
+        """Return a county's code ('CODE' flag) or a code's county name, raises CodeLookupError if not found."""
+        index = get_index(file)
+        if data_lookup_flag == 'CODE':
+            return index.get_county_code(target_state, target_county)
+        return index.get_county_name(target_state, target_code)
 
     def add_up(self, data: dict) -> tuple:
         """Get remainder of population that is not accounted for (certain RACE/AGE codes not asked for)"""
@@ -83,6 +123,7 @@ class Demographic:
         return percents
 
     def plot_demographic_data(self, demo_dict: dict, county_name: str, state_name: str, data_type: str) -> tuple:
+        """Returns the pie chart of one census breakdown as (render function, arguments), see render_charts."""
         data = {key: int(value) for key, value in demo_dict.items()}
         percents = self.get_percents(data, data['Total Population'])
         labels = list(percents.values())
@@ -92,72 +133,30 @@ class Demographic:
             legend_labels.append(str(key) + ", " + str(percent))
 
         sizes = [value for value in data.values()]
-
-        # Create the pie chart
-        plt.figure(figsize=(10, 8))
-
-        plt.pie(sizes, labels=labels, startangle=140)
-        plt.axis('equal')  # Equal aspect ratio ensures that pie is drawn as a circle.
-        plt.title(f'{data_type.capitalize()} Distribution for {county_name}, {state_name}')
-        plt.legend(legend_labels, loc="upper right", bbox_to_anchor=(1.1,1.1))
-
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, str(data_type) + ".png")
-
-        plt.savefig(temp_path)
-        plt.close()
-
-        return (temp_dir, temp_path)
+        title = f'{data_type.capitalize()} Distribution for {county_name}, {state_name}'
+        return (render_pie_chart, (sizes, labels, legend_labels, title))
 
     # done
     def get_demographic_data(self, target_state: int, target_county: int, filename: str) -> list:
-        base_url = "https://api.census.gov/data/2019/pep/charagegroups"
-        # urls for getting all data
-        # get all race data for every county in given state
-
+        # get all race, age group and sex data for the county, each code set in as few requests as the API allows
         state_name = self.state_lookup("NAME", "", target_state, filename)
         county_name = self.county_lookup("NAME", state_name, "", target_county, filename)
 
         race_codes = {'Total Population':0, 'White':1, 'Black':2, 'Native':3, 'Asian':4, 'Hawaiian':5}
-        total_queries = len(race_codes)
-        count_queries = 1
-        # race_codes = {'Total Population': 0, 'White': 1}
-        for key, value in race_codes.items():
-            logging.info(f'Accessing United States Census Bureau data with RACE code {value}: Query {count_queries}/{total_queries}')
-            count_queries = count_queries + 1
-            population = self.get_request_data(f'{base_url}?get=NAME,POP&RACE={value}&for=county:{target_county}&in=state:{target_state}')
-            final = self.get_target_county_population(population)
-            race_codes[key] = final
+        age_codes = {'Total Population':0, 'Under 18': 19, '18-24':23, '24-44':24, '45-64':25}
+        sex_codes = {'Total Population': 0, 'Male':1, 'Female':2}
+        populations = self.census.get_all_populations({'RACE': race_codes, 'AGEGROUP': age_codes, 'SEX': sex_codes},
+                                                      target_state, target_county)
+
+        race_codes = populations['RACE']
         nums = self.add_up(race_codes)
         race_codes['Other'] = str(nums[0] - nums[1])
 
-
-        # get all age group data
-        age_codes = {'Total Population':0, 'Under 18': 19, '18-24':23, '24-44':24, '45-64':25}
-        total_queries = len(age_codes)
-        count_queries = 1
-        for key, value in age_codes.items():
-            logging.info(f'Accessing United States Census Bureau data with AGE code {value}: Query {count_queries}/{total_queries}')
-            count_queries = count_queries + 1
-            population = self.get_request_data(f'{base_url}?get=NAME,POP&AGEGROUP={value}&for=county:{target_county}&in=state:{target_state}')
-            final = self.get_target_county_population(population)
-            age_codes[key] = final
-
+        age_codes = populations['AGEGROUP']
         nums = self.add_up(age_codes)
         age_codes['Above 64'] = str(nums[0] - nums[1])
 
-
-        # # get all sex group data
-        sex_codes = {'Total Population': 0, 'Male':1, 'Female':2}
-        total_queries = len(sex_codes)
-        count_queries = 1
-        for key, value in sex_codes.items():
-            logging.info(f'Accessing United States Census Bureau data with SEX code {value}: Query {count_queries}/{total_queries}')
-            count_queries = count_queries + 1
-            population = self.get_request_data(f'{base_url}?get=NAME,POP&SEX={value}&for=county:{target_county}&in=state:{target_state}')
-            final = self.get_target_county_population(population)
-            sex_codes[key] = final
-
+        sex_codes = populations['SEX']
         nums = self.add_up(sex_codes)
         sex_codes['Other'] = str(nums[0] - nums[1])
 
@@ -166,23 +165,22 @@ class Demographic:
         sexs = self.plot_demographic_data(sex_codes, county_name, state_name, 'sex')
         return [races, ages, sexs]
 
-    def extract_migration_data(self, data: list) -> dict:
+    def extract_migration_data(self, data: dict) -> dict:
+        # None marks a year without data, 0 is a real value now that the columns are numbers
         if data == 0:
-            return {'Domestic Migration': 0, 'International Migration': 0, 'Net Migration': 0}
+            return {'Domestic Migration': None, 'International Migration': None, 'Net Migration': None}
         else:
-            data = data[1]
-
-            ndm = data[1]
-            im = data[2]
-            nm = data[3]
+            ndm = data['DOMESTICMIG'][0]
+            im = data['INTERNATIONALMIG'][0]
+            nm = data['RNETMIG'][0]
 
             return {'Domestic Migration': ndm, 'International Migration': im, 'Net Migration': nm}
 
     def plot_migration_data(self, data: dict, migration_key: str, target_state: str, target_county: str) -> tuple:
-
+        """Returns the line chart of one migration component as (render function, arguments), see render_charts."""
         place = f'{target_county}, {target_state}'
-        x = [year for year in list(data.keys()) if data[year][migration_key] != 0]
-        y = [float(data[year][migration_key]) for year in list(data.keys()) if data[year][migration_key] != 0]
+        x = [year for year in list(data.keys()) if data[year][migration_key] is not None]
+        y = [float(data[year][migration_key]) for year in list(data.keys()) if data[year][migration_key] is not None]
 
         if len(x) == 1:
             between_years = [x[0]]
@@ -191,38 +189,18 @@ class Demographic:
         else:
             between_years = [x[0], x[-1]]
 
-        fig, ax = plt.subplots()
-
-        plt.figure(figsize=(10, 6))
-        plt.plot(x, y, marker='o', linestyle='-', color='blue')
-
-        plt.xlabel('Year')
-        plt.ylabel(migration_key)
-
+        ylabel = migration_key
         if migration_key == 'Net Migration':
-            plt.ylabel('Net Migration (thousands)')
+            ylabel = 'Net Migration (thousands)'
 
         if len(between_years) == 0:
-            plt.title(f'No Data Between Years 2010-2021 for {place}')
-            plt.grid(True)
-
-            plt.ylim(100, -100)
+            title = f'No Data Between Years 2010-2021 for {place}'
         elif len(between_years) == 1:
-            plt.title(f'{migration_key} for {between_years[0]} for {place}')
-            plt.grid(True)
-            ax.autoscale(axis='y')
+            title = f'{migration_key} for {between_years[0]} for {place}'
         else:
-            plt.title(f'{migration_key} Between Years {between_years[0]}-{between_years[1]} for {place}')
-            plt.grid(True)
-            ax.autoscale(axis='y')
+            title = f'{migration_key} Between Years {between_years[0]}-{between_years[1]} for {place}'
 
-        temp_dir = tempfile.mkdtemp()
-        temp_path = os.path.join(temp_dir, str(migration_key) + ".png")
-
-        plt.savefig(temp_path)
-        plt.close()
-
-        return (temp_dir, temp_path)
+        return (render_line_chart, (x, y, ylabel, title))
 
     def get_migration_data(self, target_state: int, target_county: int, filename: str) -> list:
         state_name = self.state_lookup("NAME", "", target_state, filename)
@@ -234,11 +212,11 @@ class Demographic:
         years = ['2010', '2011', '2012', '2013', '2014', '2015', '2016', '2017', '2018', '2019', '2020', '2021']
         years_data = {key: 0 for key in years}
 
-        for year in years:
-            base_url = f'https://api.census.gov/data/{year}/{dsource}/{dname}'
-            data_url = f'{base_url}?get={cols}&for=county:{target_county}&in=state:{target_state}'
-            logging.info(f'Accessing United States Census Bureau MIGRATION data for {year}')
-            final = self.get_request_data(data_url)
+        # every year is its own dataset, so the years are fetched concurrently instead of batched
+        urls = [f'{CENSUS_URL}/{year}/{dsource}/{dname}?get={cols}&for=county:{target_county}&in=state:{target_state}'
+                for year in years]
+        logging.info(f'Accessing United States Census Bureau MIGRATION data for {years[0]}-{years[-1]}')
+        for year, final in zip(years, self.census.get_many(urls)):
             if final == 0:
                 logging.info(f'No data for year {year}')
             migration_data = self.extract_migration_data(final)
@@ -254,11 +232,46 @@ class Demographic:
 
     def get_all_census_data(self, target_state: str, target_county: str) -> tuple:
 
-        map_file = 'state_county_mapping.json'
-        state_code = self.state_lookup('CODE', target_state, 00, map_file)
-        county_code = self.county_lookup('CODE', target_state, target_county, 00, map_file)
-
-        demographic_data = self.get_demographic_data(state_code, county_code, map_file)
-        migration_data = self.get_migration_data(state_code, county_code, map_file)
-
-        return (demographic_data, migration_data)
+        map_file = MAPPING_FILE
+        try:
+            state_code = self.state_lookup('CODE', target_state, '', map_file)
+            county_code = self.county_lookup('CODE', target_state, target_county, '', map_file)
+        except CodeLookupError as error:
+            # the report shows (404, 404) as demographics not available
+            logging.info(f'No census data: {error}')
+            return (404, 404)
+
+        # workers start up and load matplotlib while the census requests are out, unless cached charts may
+        # make them unnecessary, then they only start for charts missing from the cache
+        executor = start_chart_workers(self.chart_workers) if self.chart_cache is None else None
+        try:
+            demographic_charts = self.get_demographic_data(state_code, county_code, map_file)
+            migration_charts = self.get_migration_data(state_code, county_code, map_file)
+
+            # all six charts are drawn at once, the report embeds their PNG bytes directly
+            charts = self.render_cached_charts(demographic_charts + migration_charts, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        return (charts[:len(demographic_charts)], charts[len(demographic_charts):])
+
+    def render_cached_charts(self, charts: list, executor: ProcessPoolExecutor | None) -> list:
+        """Render charts to PNG bytes, taking those drawn from the same data before out of the chart cache."""
+        if self.chart_cache is None:
+            return render_charts(charts, executor)
+
+        keys = [get_chart_key(function.__name__, args) for function, args in charts]
+        images = [self.chart_cache.get(key) for key in keys]
+        missing = [index for index, image in enumerate(images) if image is None]
+        if missing:
+            executor = start_chart_workers(min(self.chart_workers, len(missing)))
+            try:
+                rendered = render_charts([charts[index] for index in missing], executor)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            for index, image in zip(missing, rendered):
+                images[index] = image
+                self.chart_cache.put(keys[index], image)
+        logging.info(f'{len(charts) - len(missing)} of {len(charts)} census charts taken from the chart cache')
+        return images
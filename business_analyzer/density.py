@@ -0,0 +1,109 @@
+import io
+
+import numpy as np
+
+from normalize import PlaceTable
+from spatial import MILES_PER_DEGREE
+
+DEFAULT_CELL_MILES = 0.1
+DEFAULT_BANDWIDTH_MILES = 0.3
+# the grid is coarsened past this many cells a side so smoothing stays cheap over wide areas
+MAX_CELLS = 400
+# what each place adds to the density, count adds 1 per place, and how the density reads with it
+WEIGHTS = {
+    'count': 'Places per square mile',
+    'rating': 'Rating stars per square mile',
+    'reviews': 'Reviews per square mile',
+}
+
+
+def get_weights(table: PlaceTable, weight: str = 'count') -> np.ndarray | None:
+    """Returns how much each place adds to the density, places without a rating add nothing when weighing by rating."""
+    if weight == 'rating':
+        return np.nan_to_num(table.rating)
+    if weight == 'reviews':
+        return table.user_ratings_total.astype(float)
+    return None
+
+
+def get_kernel_matrix(size: int, sigma: float) -> np.ndarray:
+    """Returns a size x size matrix that applies a normalized 1-D Gaussian blur of sigma cells along one axis."""
+    offsets = np.arange(size)[:, None] - np.arange(size)[None, :]
+    kernel = np.where(np.abs(offsets) <= 3 * sigma, np.exp(-0.5 * (offsets / sigma) ** 2), 0)
+    # weights of a full kernel, so a place keeps its whole mass wherever it sits in the grid
+    support = np.arange(-np.floor(3 * sigma), np.floor(3 * sigma) + 1)
+    return kernel / np.exp(-0.5 * (support / sigma) ** 2).sum()
+
+
+class DensityGrid:
+    """Gaussian kernel density of places per square mile over a regular lat/lng grid.
+
+    Places are binned into cells first and the bins blurred along each axis, so the cost grows with the number of
+    places only through the histogram.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, weights: np.ndarray | None = None,
+                 cell_miles: float = DEFAULT_CELL_MILES, bandwidth_miles: float = DEFAULT_BANDWIDTH_MILES):
+        located = np.isfinite(lat) & np.isfinite(lng)
+        lat, lng = np.asarray(lat)[located], np.asarray(lng)[located]
+        weights = None if weights is None else np.asarray(weights)[located]
+        self.count = len(lat)
+        # the located places and what each adds, a heat layer smooths these itself
+        self.lat, self.lng = lat, lng
+        self.weights = np.ones(self.count) if weights is None else weights.astype(float)
+        if self.count == 0:
+            lat, lng = np.zeros(1), np.zeros(1)
+            weights = np.zeros(1)
+
+        # the grid reaches three bandwidths past the outermost places so their kernels are not cut off
+        pad = 3 * bandwidth_miles
+        lng_scale = np.cos(np.radians(lat.mean()))
+        span = max((lat.max() - lat.min()) * MILES_PER_DEGREE, (lng.max() - lng.min()) * MILES_PER_DEGREE * lng_scale)
+        self.cell_miles = max(cell_miles, (span + 2 * pad) / MAX_CELLS)
+        lat_cell = self.cell_miles / MILES_PER_DEGREE
+        lng_cell = self.cell_miles / (MILES_PER_DEGREE * lng_scale)
+        lat_edges = np.arange(lat.min() - pad / MILES_PER_DEGREE, lat.max() + pad / MILES_PER_DEGREE + lat_cell, lat_cell)
+        lng_edges = np.arange(lng.min() - pad / (MILES_PER_DEGREE * lng_scale),
+                              lng.max() + pad / (MILES_PER_DEGREE * lng_scale) + lng_cell, lng_cell)
+
+        binned, _, _ = np.histogram2d(lat, lng, bins=[lat_edges, lng_edges], weights=weights)
+        sigma = max(bandwidth_miles / self.cell_miles, 0.5)
+        smoothed = get_kernel_matrix(len(lat_edges) - 1, sigma) @ binned @ get_kernel_matrix(len(lng_edges) - 1, sigma)
+        # rows run south to north, columns west to east
+        self.values = smoothed / self.cell_miles ** 2
+        self.lat_centers = (lat_edges[:-1] + lat_edges[1:]) / 2
+        self.lng_centers = (lng_edges[:-1] + lng_edges[1:]) / 2
+        self.extent = (lng_edges[0], lng_edges[-1], lat_edges[0], lat_edges[-1])
+
+    def get_heat_points(self) -> list:
+        """Returns [lat, lng, weight from 0 to 1] for every place that adds to the density, for a map heat layer.
+
+        One point per place rather than per cell keeps the map small, the heat layer does its own smoothing.
+        """
+        peak = self.weights.max() if self.count else 0
+        if peak <= 0:
+            return []
+        adds = self.weights > 0
+        return np.column_stack((self.lat[adds], self.lng[adds], self.weights[adds] / peak)).tolist()
+
+
+def plot_density(grid: DensityGrid, center: tuple, weight: str = 'count') -> bytes:
+    """Draws the density surface around the search center and returns it as PNG bytes."""
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 6))
+    ax = fig.add_subplot()
+    image = ax.imshow(grid.values, origin='lower', extent=grid.extent, cmap='hot_r', interpolation='bilinear')
+    ax.plot(center[1], center[0], marker='*', markersize=14, color='blue', linestyle='none', label='Location')
+    # degrees of longitude are shorter than degrees of latitude away from the equator
+    ax.set_aspect(1 / np.cos(np.radians(center[0])))
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlabel('Longitude')
+    ax.set_ylabel('Latitude')
+    ax.set_title('Competitor Density')
+    ax.legend(loc='upper right')
+    fig.colorbar(image, ax=ax, label=WEIGHTS[weight], shrink=0.8)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
@@ -1,139 +1,126 @@
-import json
-import os
-from docx import Document
-import pandas as pd
 import numpy as np
-import argparse
-import data as gd
-import heapq
-from datetime import datetime
 
 import utilities as ut
+from normalize import PlaceTable
+from occupancy import OccupancyIndex, format_minute_of_week, plot_coverage
+from place import DAYS, MINUTES_PER_DAY, MINUTES_PER_WEEK, convert_to_military
+
+class WeeklyHours:
+    """Open intervals of every place as minutes since Sunday 00:00, with the per place statistics computed in one pass.
+
+    Intervals that run past Saturday midnight keep going past MINUTES_PER_WEEK rather than wrapping.
+    Places open 24/7 are flagged in always_open and left out of the intervals.
+    """
+
+    def __init__(self, periods: list):
+        count = len(periods)
+        self.has_hours = np.array([bool(place_periods) for place_periods in periods], dtype=bool)
+        rows = np.array([(index, open_day, open_minute, -1 if close_day is None else close_day,
+                          -1 if close_minute is None else close_minute)
+                         for index, place_periods in enumerate(periods) if place_periods
+                         for open_day, open_minute, close_day, close_minute in place_periods],
+                        dtype=np.int64).reshape(-1, 5)
+        place, open_day, open_minute, close_day, close_minute = rows.T
+
+        # a period without a close time means the place never closes
+        no_close = close_day == -1
+        self.always_open = np.zeros(count, dtype=bool)
+        self.always_open[place[no_close]] = True
+
+        timed = ~no_close
+        self.place = place[timed]
+        self.open_day = open_day[timed]
+        self.start = open_day[timed] * MINUTES_PER_DAY + open_minute[timed]
+        self.end = close_day[timed] * MINUTES_PER_DAY + close_minute[timed]
+        # closing on an earlier weekday than opening means the period crosses Saturday midnight
+        self.end = np.where(self.end <= self.start, self.end + MINUTES_PER_WEEK, self.end)
+
+        self.total_minutes = np.bincount(self.place, weights=self.end - self.start, minlength=count)
+        self.opens_per_day = np.bincount(self.place * 7 + self.open_day, minlength=count * 7).reshape(count, 7)
+        self.earliest_open = np.full(count, MINUTES_PER_DAY, dtype=np.int64)
+        np.minimum.at(self.earliest_open, self.place, self.start - self.open_day * MINUTES_PER_DAY)
+        # measured from midnight of the opening day, so closing at 2am after a late night is later than 11pm
+        self.latest_close = np.full(count, -1, dtype=np.int64)
+        np.maximum.at(self.latest_close, self.place, self.end - self.open_day * MINUTES_PER_DAY)
+
+    def get_analyzed(self) -> np.ndarray:
+        """Returns indexes of places with known hours that are not open 24/7."""
+        return np.flatnonzero(self.has_hours & ~self.always_open)
 
 class AnalyzeHours:
+    getters = (ut.get_name, ut.get_address, ut.get_opening_hours)
 
-    def get_total_hours_open(self, hours: dict) -> dict:
-        """Gets all hours open for all places."""
-        hours = ut.delete_dne(hours)
-        all_hours = {}
-        for place in hours:
-            total_hours = {place: 0}
-            days = hours[place]
-            for day, hour in days.items():
-                # 0 means closed
-                if hour != 0:
-                    open = int(hour[0])
-                    close = int(hour[1])
-                    result = close - open
-                    final_result = f"{result:04d}"
-                    total_hours[place] = total_hours[place] + int(final_result[:2])
-            # total_hours returns a dictionary that has every place name with hours open during the week
-            all_hours[place] = total_hours[place]
-        return all_hours
-
-    def get_average_hours_open(self, hours: dict) -> list:
+    def get_labels(self, table: PlaceTable) -> list:
+        """Returns a 'name (street, town)' label for every place."""
+        return [f'{name} ({",".join(address.split(",")[:-1])})' for name, address in zip(table.names, table.addresses)]
+
+    def format_time(self, minutes: int) -> str:
+        """Formats minutes after midnight (wrapping past the next midnight) as 12 hour time."""
+        return ut.convert_time(convert_to_military(int(minutes) % MINUTES_PER_DAY))
+
+    def get_average_hours_open(self, week: WeeklyHours, places: np.ndarray) -> list:
         """Get average hours open of all places."""
-        all_hours = self.get_total_hours_open(hours)
-        average = sum(value for value in all_hours.values()) / len(all_hours)
+        if len(places) == 0:
+            return []
+        average = float(week.total_minutes[places].mean()) / 60
         per_day = average / 7
         avg = ("Average Hours Open", round(average, 2))
         per = ("Average Hours Per Day", round(per_day, 2))
         return  [avg, per]
 
-    def get_most_hours_open(self, hours: dict) -> list:
+    def get_most_hours_open(self, week: WeeklyHours, places: np.ndarray, labels: list) -> list:
         """Return list of places that are open the most during the week."""
-        all_hours = self.get_total_hours_open(hours)
-        most_hours = heapq.nlargest(5, all_hours.items(), key=lambda pair: pair[1])
-        return most_hours
+        hours = week.total_minutes[places] / 60
+        most = np.argsort(-hours, kind='stable')[:5]
+        return [(labels[places[index]], round(float(hours[index]), 2)) for index in most]
 
-    def get_least_hours_open(self, hours: dict) -> list:
+    def get_least_hours_open(self, week: WeeklyHours, places: np.ndarray, labels: list) -> list:
         """Return list of places that are open the least during the week."""
-        all_hours = self.get_total_hours_open(hours)
-        least_hours = heapq.nsmallest(5, all_hours.items(), key=lambda pair: pair[1])
-        return least_hours
+        hours = week.total_minutes[places] / 60
+        least = np.argsort(hours, kind='stable')[:5]
+        return [(labels[places[index]], round(float(hours[index]), 2)) for index in least]
 
-    def standardize_places_closed(self, data: dict) -> list:
-        """Makes data into a list of tuples to make writing to word document easier."""
+    def get_most_days_closed(self, week: WeeklyHours, places: np.ndarray, labels: list) -> list:
+        """Returns list of (day, number of places closed, places names) for days that have places closed."""
+        closed = week.opens_per_day[places] == 0
         list_tuples = []
-        for day in data:
-            one = day
-            two = data[day]['days']
-            three = ", ".join(data[day]['places'])
-            list_tuples.append((one, two, three))
+        for day, day_closed in zip(DAYS, closed.T):
+            closed_places = places[day_closed]
+            if len(closed_places) != 0:
+                list_tuples.append((day, len(closed_places), ", ".join(labels[index] for index in closed_places)))
         return list_tuples
 
-    def get_most_days_closed(self, hours: dict) -> list:
-        """Returns list of days that have places closed on that day with places names."""
-        days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-        days_closed = {key: {"days": 0, "places": []} for key in days}
-        hours = ut.delete_dne(hours)
-        
-        for place in hours:
-            days = hours[place]
-            for day in days:
-                if days[day] == 0:
-                    days_closed[day]['days'] = days_closed[day]['days'] + 1
-                    days_closed[day]['places'].append(place)
-        
-        days_closed = {key: value for key, value in days_closed.items() if value['days'] != 0}
-        return self.standardize_places_closed(days_closed)
-
-    def get_earliest_open_places(self, hours: dict) -> list:
+    def get_earliest_open_places(self, week: WeeklyHours, places: np.ndarray, labels: list) -> list:
         """Returns list of places open the earliest during the week."""
-        hours = ut.delete_dne(hours)
-        early_hours = {}
-        for place in hours:
-            total_hours = {place: 0}
-            for day, hour in hours[place].items():
-                if hour != 0:
-                    open = ut.convert_time(hour[0])
-                    total_hours[place] = open
-            early_hours[place] = total_hours[place]
-
-        early_hours = heapq.nsmallest(5, early_hours.items(), key=lambda pair: pair[1])
-        return early_hours
-
-    def get_latest_open_places(self, hours: dict) -> list:
+        earliest = np.argsort(week.earliest_open[places], kind='stable')[:5]
+        return [(labels[places[index]], self.format_time(week.earliest_open[places[index]])) for index in earliest]
+
+    def get_latest_open_places(self, week: WeeklyHours, places: np.ndarray, labels: list) -> list:
         """Returns list of places open the latest during the week."""
-        hours = ut.delete_dne(hours)
-        late_hours = {}
-        for place in hours:
-            total_hours = {place: 0}
-            for day, hour in hours[place].items():
-                if hour != 0:
-                    close = ut.convert_time(hour[1])
-                    total_hours[place] = close
-            late_hours[place] = total_hours[place]
-
-        late_hours = heapq.nlargest(5, late_hours.items(), key=lambda pair: pair[1])
-        return late_hours
-
-    def analyze_hours_report(self, details: dict) -> list:
+        latest = np.argsort(-week.latest_close[places], kind='stable')[:5]
+        return [(labels[places[index]], self.format_time(week.latest_close[places[index]])) for index in latest]
+
+    def analyze_hours_report(self, table: PlaceTable) -> list:
         """Function runs and returns all other functions as final report of hours."""
-        details = ut.delete_non_operational_businesses(details)
-        hours = {}
-        for place in details:
-            name = ut.get_name(details[place])
-            address = ut.get_address(details[place])
-            name = f'{name} ({",".join(address.split(",")[:-1])})'
-
-            hours[name] = ut.get_opening_hours(details[place])
-        
-        always_open_places = []
-        for place in hours: 
-            if isinstance(hours[place], dict) and hours[place]['Sunday'] == ("2424", "2424"):
-                always_open_places.append(place)
-        
-        for place in always_open_places:
-            hours.pop(place)
-
-        most_open_places = self.get_most_hours_open(hours)
-        least_open_places = self.get_least_hours_open(hours)
-        average_hour_open = self.get_average_hours_open(hours)
-        most_days_closed = self.get_most_days_closed(hours)
-        earliest_open_places = self.get_earliest_open_places(hours)
-        latest_open_places = self.get_latest_open_places(hours)
-
-        return [most_open_places, least_open_places, average_hour_open, most_days_closed, earliest_open_places, latest_open_places, always_open_places]
-        # return [most_open_places, least_open_places, average_hour_open, most_days_closed, earliest_open_places, latest_open_places]
-    
\ No newline at end of file
+        labels = self.get_labels(table)
+        week = WeeklyHours(table.periods)
+        always_open_places = [labels[index] for index in np.flatnonzero(week.always_open)]
+        places = week.get_analyzed()
+
+        most_open_places = self.get_most_hours_open(week, places, labels)
+        least_open_places = self.get_least_hours_open(week, places, labels)
+        average_hour_open = self.get_average_hours_open(week, places)
+        most_days_closed = self.get_most_days_closed(week, places, labels)
+        earliest_open_places = self.get_earliest_open_places(week, places, labels)
+        latest_open_places = self.get_latest_open_places(week, places, labels)
+
+        # competitors open in every 15 minutes of the week, 24/7 places count everywhere
+        occupancy = OccupancyIndex(week.start, week.end, int(week.always_open.sum()))
+        coverage_chart = plot_coverage(occupancy.get_coverage())
+        gaps = occupancy.get_gaps()
+        # nothing open all week means no place has known hours, a gap with no start or end is None
+        gaps = None if gaps == [(0, MINUTES_PER_WEEK)] else [(format_minute_of_week(start), format_minute_of_week(end))
+                                                            for start, end in gaps]
+
+        return [most_open_places, least_open_places, average_hour_open, most_days_closed, earliest_open_places, latest_open_places, always_open_places,
+                coverage_chart, gaps]
@@ -1,18 +1,33 @@
-import json
-import googlemaps
+import time
+# taken before anything else is imported, --profile-startup measures from here
+STARTUP_TIME = time.perf_counter()
+
 import argparse
+import importlib
 import logging
+import sys
 from pathlib import Path
 
 import data as gd
 import utilities as ut
-from mapper import Mapper
+from mapper import Mapper, MAP_BACKENDS
 from hours import AnalyzeHours
 from servings import AnalyzeServing
 from rating import Rating
+from density import DensityGrid, WEIGHTS, get_weights, plot_density
+from rings import AnalyzeRings, METERS_PER_MILE, parse_rings
+from competition import AnalyzeCompetition
+from cache import ChartCache, DetailsCache
+from pipeline import StageRunner
+from place import save_places, load_places
+from normalize import PlaceTable
 from demographic import Demographic
 from write_document import WriteDocument
 
+# heavy dependencies the stages load on first use, in the order they are needed
+LAZY_DEPENDENCIES = ['googlemaps', 'matplotlib.figure', 'folium', 'selenium.webdriver', 'docx']
+STARTUP_BUDGET = 0.5
+
 def get_parser():
     """Get arguments needed to run whole function."""
     parser = argparse.ArgumentParser()
@@ -23,10 +38,52 @@ def get_parser():
     parser.add_argument("-t", "--type", help='Type of business to look for', type=str, required=False)
     parser.add_argument("-c", "--county", help='County to research but must be in state', type=str, required=False)
     parser.add_argument("-s", "--state", help='State to research', type=str, required=False)
+    parser.add_argument("-w", "--workers", help='Number of place details to fetch concurrently', type=int, default=8)
+    parser.add_argument("--tiled", help='Split the search circle where results are capped', action='store_true')
+    parser.add_argument("--cache-dir", help='Directory to cache place details in between runs', type=str, required=False)
+    parser.add_argument("--max-cache-age", help='Hours before a cached place is fetched again', type=float, default=24)
+    parser.add_argument("--max-chart-cache", help='Megabytes of rendered charts and maps to keep in the cache',
+                        type=float, default=200)
+    parser.add_argument("--tier", help='full analysis, or fast to use nearby search results only', type=str,
+                        choices=['full', 'fast'], default='full')
+    parser.add_argument("--reviews", help='Number of good and bad reviews to quote', type=int, default=5)
+    parser.add_argument("--review-rank", help='Which reviews to quote first', type=str,
+                        choices=['recency', 'length', 'rating'], default='recency')
+    parser.add_argument("--rings", help='Comma separated radii in miles to compare, i.e. 1,2,5', type=parse_rings,
+                        required=False)
+    parser.add_argument("--density-weight", help='What each place adds to the competitor density', type=str,
+                        choices=list(WEIGHTS), default='count')
+    parser.add_argument("--map-backend", help='static draws the map offline, browser screenshots it in Firefox', type=str,
+                        choices=list(MAP_BACKENDS), default='static')
+    parser.add_argument("--tile-dir", help='Folder of cached basemap tiles laid out as zoom/x/y.png', type=str,
+                        required=False)
+    parser.add_argument("--profile-startup", help='Report import times and exit', action='store_true')
     args = parser.parse_args()
-    return args.api_key_filename, args.location, args.radius, args.type, args.county, args.state
+    return (args.api_key_filename, args.location, args.radius, args.type, args.county, args.state, args.workers,
+            args.tiled, args.cache_dir, args.max_cache_age, args.max_chart_cache, args.tier, args.reviews,
+            args.review_rank, args.rings, args.density_weight, args.map_backend, args.tile_dir, args.profile_startup)
+
+def profile_startup(startup_seconds: float) -> None:
+    """Log time taken until arguments were parsed against the budget, and what each lazy dependency costs to import."""
+    logging.info(f'Startup until arguments parsed: {startup_seconds:.3f}s (budget {STARTUP_BUDGET}s)')
+    if startup_seconds > STARTUP_BUDGET:
+        logging.warning('Startup is over budget, check for heavy imports at module level')
+
+    for module in LAZY_DEPENDENCIES:
+        if module in sys.modules:
+            logging.warning(f'  {module}: already imported at startup')
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError as error:
+            logging.info(f'  {module}: not installed ({error})')
+            continue
+        logging.info(f'  {module}: {time.perf_counter() - start:.3f}s')
 
 def get_place_lat_lng(api_key: str, place_name: str):
+    import googlemaps
+
     gmaps = googlemaps.Client(key=api_key)
     # Use the Geocoding API to get the latitude and longitude
     geocode_result = gmaps.geocode(place_name)
@@ -45,6 +102,9 @@ def get_all_lats_lngs(data: dict):
 
     return place_coordinates
 
+def get_all_ratings(data: dict):
+    return [ut.get_rating(data[place]) for place in data]
+
 def main() -> None:
     """
     This is the main function for the business analyzer.
@@ -53,19 +113,32 @@ def main() -> None:
     """
     logging.basicConfig(level=logging.INFO)
 
-    api_key_filename, location, radius, business_type, county, state = get_parser()
+    (api_key_filename, location, radius, business_type, county, state, workers, tiled,
+     cache_dir, max_cache_age, max_chart_cache, tier, review_count, review_rank, rings, density_weight,
+     map_backend, tile_dir, startup_profile) = get_parser()
+    if startup_profile:
+        profile_startup(time.perf_counter() - STARTUP_TIME)
+        return 0
+
     api_key = str(ut.get_google_api_key(str(api_key_filename)))
     location = str(location)
-    radius = int(radius)
+    # rings are all analyzed from one search at the largest of them
+    if rings and radius is not None:
+        logging.warning(f'--rings searches out to {rings[-1]:g} miles, ignoring -r {radius}')
+    radius = round(rings[-1] * METERS_PER_MILE) if rings else int(radius)
     business_type = str(business_type)
     county = str(county)
     state = str(state)
 
-    create_mapping = Mapper()
+    # charts and maps drawn from the same data are reused from the cache directory too
+    chart_cache = ChartCache(cache_dir, max_bytes=int(max_chart_cache * 1024 * 1024)) if cache_dir else None
+    create_mapping = Mapper(map_backend, tile_dir, chart_cache)
     analyze_hours = AnalyzeHours()
     analyze_servings = AnalyzeServing()
-    analyze_ratings = Rating()
-    analyze_demographics = Demographic()
+    analyze_ratings = Rating(review_count, review_rank)
+    analyze_rings = AnalyzeRings(rings) if rings else None
+    analyze_competition = AnalyzeCompetition()
+    analyze_demographics = Demographic(chart_cache=chart_cache)
     write_to_document = WriteDocument()
     # comment these out to stop calling api and write to json file
     coordinates = get_place_lat_lng(api_key, location)
@@ -74,37 +147,58 @@ def main() -> None:
         print('Please enter valid location.')
         exit()
 
-    logging.info('Analyzing demographic trends and data')
-    demos = analyze_demographics.get_all_census_data(state, county)
-
-    # get place details using data.py and write to json file
-    details = gd.main(str(api_key), coordinates, radius, business_type)
-    county = county.replace(" ", "_")
-    json_filename = Path("json_files") / Path(f'{county}_{state}_{business_type}.json')
-    with open(json_filename, 'w') as file:
-        json.dump(details, file, indent=4)
-    data = {}
-    with open(json_filename, "r") as file:
-        data = json.load(file)
-
-    points = get_all_lats_lngs(data)
-
-    logging.info('Creating visual of places')
-    visual_map = create_mapping.create_map(coordinates, points, location, business_type, 14)
-
-    logging.info('Analyzing hours')
-    hours = analyze_hours.analyze_hours_report(data)
-
-    logging.info('Analyzing servings')
-    servings = analyze_servings.analyze_serving_report(data)
-
-    logging.info('Analyzing ratings')
-    ratings = analyze_ratings.rating_report(data)
+    # the fast tier makes no Place Details calls, so only the full tier needs a field mask
+    fields = None if tier == 'fast' else ut.get_detail_fields([create_mapping, analyze_hours, analyze_servings,
+                                                               analyze_ratings])
+    county_name = county.replace(" ", "_")
+    json_filename = Path("json_files") / Path(f'{county_name}_{state}_{business_type}.json')
+
+    def get_places() -> dict:
+        """Get place details using data.py, write them to the json file and read them back."""
+        details_cache = DetailsCache(cache_dir, max_age=max_cache_age * 60 * 60) if cache_dir else None
+        details = gd.main(str(api_key), coordinates, radius, business_type, workers, tiled, details_cache, fields, tier)
+        if details_cache is not None:
+            details_cache.close()
+        save_places(details, json_filename)
+        return load_places(json_filename)
+
+    # census and places share no data, so they run side by side and the analyzers start once places are in
+    runner = StageRunner(max_workers=6)
+    runner.add_stage('census', lambda: analyze_demographics.get_all_census_data(state, county))
+    runner.add_stage('places', get_places)
+    # closed businesses are dropped and fields decoded once, every analyzer reads the same table
+    runner.add_stage('table', PlaceTable.from_places, ['places'])
+    runner.add_stage('density', lambda table: DensityGrid(table.lat, table.lng, get_weights(table, density_weight)),
+                     ['table'])
+    runner.add_stage('density_chart', lambda grid: plot_density(grid, coordinates, density_weight), ['density'])
+    runner.add_stage('map', lambda data, grid: create_mapping.create_map(coordinates, get_all_lats_lngs(data), location,
+                                                                         business_type, 14, grid,
+                                                                         radius, get_all_ratings(data)),
+                     ['places', 'density'])
+    if tier == 'fast':
+        # hours, servings and reviews only come from place details, the report marks them as skipped
+        runner.add_stage('hours', lambda table: None, ['table'])
+        runner.add_stage('servings', analyze_servings.analyze_price_report, ['table'])
+        runner.add_stage('ratings', analyze_ratings.rating_summary_report, ['table'])
+    else:
+        runner.add_stage('hours', analyze_hours.analyze_hours_report, ['table'])
+        runner.add_stage('servings', analyze_servings.analyze_serving_report, ['table'])
+        runner.add_stage('ratings', analyze_ratings.rating_report, ['table'])
+    # nearby search records carry coordinates, so both tiers measure the competition
+    runner.add_stage('competition', lambda table: analyze_competition.competition_report(table, coordinates), ['table'])
+    if rings:
+        runner.add_stage('rings', lambda table: analyze_rings.analyze_rings_report(table, coordinates, tier == 'fast'),
+                         ['table'])
+    results = runner.run()
+    if chart_cache is not None:
+        chart_cache.close()
 
     logging.info('Writing to word document')
     output_doc = Path("analysis_docs") / Path(f'{location.replace(", ", "_")}_{business_type}.docx')
-    write_to_document.write_to_document(output_doc, visual_map, str(ut.convert_meters_to_miles(radius)), business_type.capitalize(),
-                        location, county, hours, ratings, servings, demos)
+    write_to_document.write_to_document(output_doc, results['map'], str(ut.convert_meters_to_miles(radius)), business_type.capitalize(),
+                        location, county_name, results['hours'], results['ratings'], results['servings'],
+                        results['census'], tier, results.get('rings'),
+                        results['density_chart'], results['competition'])
 
     logging.info(f'Successfully written to document: {output_doc}')
 
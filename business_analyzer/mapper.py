@@ -1,38 +1,133 @@
-import folium
-from selenium import webdriver
 from time import sleep
 from pathlib import Path
 import logging
 
+import utilities as ut
+from cache import ChartCache, get_chart_key
+from clusters import cluster_points, get_located
+from density import DensityGrid
+
 logging.basicConfig(level=logging.INFO)
 
-class Mapper:
-    def create_map(self, center: tuple, points: list, loco: str, business_type: str, zoom_factor: int):
-        try:
-            map_center = [center[0], center[1]]
-            my_map = folium.Map(location=map_center, zoom_start=zoom_factor)
+# how the map picture is made: drawn offline, or a screenshot of the folium map in Firefox
+MAP_BACKENDS = ('static', 'browser')
 
-            marker_locations = points
-            for location in marker_locations:
-                folium.Marker(location=location, popup="Marker").add_to(my_map)
+class Mapper:
+    # the density layer can be weighted by each place's number of reviews
+    getters = (ut.get_exact_location, ut.get_user_ratings_total)
 
-            html_file_path = f'{loco}_{business_type}_map.html'
-            save_path = Path('.') / html_file_path
-            my_map.save(save_path)
+    def __init__(self, backend: str = 'static', tile_dir: str = None, chart_cache: ChartCache = None):
+        if backend not in MAP_BACKENDS:
+            raise ValueError(f'Unknown map backend {backend}, expected one of {", ".join(MAP_BACKENDS)}')
+        self.backend = backend
+        self.tile_dir = tile_dir
+        self.chart_cache = chart_cache
 
-            driver = webdriver.Firefox()
-            driver.get(f'file://{save_path.resolve()}')
-            sleep(1)
+    def get_screenshot_path(self, loco: str, business_type: str) -> Path:
+        maps_dir = Path('maps')
+        maps_dir.mkdir(exist_ok=True)
+        return maps_dir / f'{loco}_{business_type}_map.png'
 
-            screenshot_filename = f'{loco}_{business_type}_map.png'
-            maps_dir = Path('maps')
-            maps_dir.mkdir(exist_ok=True)
-            get_screenshot_path = maps_dir / screenshot_filename
-            driver.get_screenshot_as_file(get_screenshot_path)
+    def create_map(self, center: tuple, points: list, loco: str, business_type: str, zoom_factor: int,
+                   density: DensityGrid = None, radius: float = None, ratings: list = None):
+        """Returns the path of a map picture of the places, or "1" when it could not be made.
 
-            driver.quit()
+        Places close together at the map's zoom are drawn as one marker with their count and average rating, over
+        the competitor density when given.
+        """
+        try:
+            located = get_located(points, ratings)
+            # the same places drawn the same way give the same picture, whatever the location is called, the
+            # density only adds what each place weighs
+            key = get_chart_key('map', self.backend, self.get_tiles_fingerprint(center, zoom_factor, radius), center,
+                                [column.tolist() for column in located], zoom_factor,
+                                radius if self.backend == 'static' else None,
+                                None if density is None else (density.weights.tolist(), density.cell_miles))
+            if self.chart_cache is not None:
+                image = self.chart_cache.get(key)
+                if image is not None:
+                    path = self.get_screenshot_path(loco, business_type)
+                    path.write_bytes(image)
+                    logging.info('Map taken from the chart cache')
+                    return str(path)
 
-            return str(get_screenshot_path)
+            if self.backend == 'static':
+                path = self.create_static_map(center, located, loco, business_type, zoom_factor, radius, density)
+            else:
+                heat = density.get_heat_points() if density is not None else None
+                path = self.create_browser_map(center, located, loco, business_type, zoom_factor, heat)
+            if self.chart_cache is not None:
+                self.chart_cache.put(key, Path(path).read_bytes())
+            return path
         except Exception as e:
             logging.info(f'ERROR: UNABLE TO CREATE VISUAL. {e}')
             return "1"
+
+    def get_static_zoom(self, center: tuple, zoom_factor: int, radius: float = None) -> int:
+        """Returns the zoom of the static map, fitted to the search radius when there is one."""
+        from static_map import STATIC_MAP_SIZE, get_fit_zoom
+
+        return get_fit_zoom(center[0], radius, STATIC_MAP_SIZE) if radius else zoom_factor
+
+    def get_tiles_fingerprint(self, center: tuple, zoom_factor: int, radius: float = None) -> list | None:
+        """Returns what the basemap tiles under the static map look like on disk, None when none are drawn."""
+        if self.backend != 'static' or self.tile_dir is None:
+            return None
+        from static_map import STATIC_MAP_SIZE, get_bounds, get_tiles_fingerprint
+
+        zoom = self.get_static_zoom(center, zoom_factor, radius)
+        bounds = get_bounds(center, zoom, STATIC_MAP_SIZE)
+        return [self.tile_dir, get_tiles_fingerprint(Path(self.tile_dir), zoom, bounds)]
+
+    def create_static_map(self, center: tuple, located: tuple, loco: str, business_type: str, zoom_factor: int,
+                          radius: float = None, density: DensityGrid = None) -> str:
+        """Draw the map offline, fitted to the search radius when there is one, with basemap tiles from tile_dir."""
+        from static_map import STATIC_MAP_SIZE, render_static_map
+
+        zoom = self.get_static_zoom(center, zoom_factor, radius)
+        clusters = cluster_points(*located, zoom)
+        path = render_static_map(center, clusters, radius or 0, self.get_screenshot_path(loco, business_type), zoom,
+                                 self.tile_dir, STATIC_MAP_SIZE, density)
+        return str(path)
+
+    def create_browser_map(self, center: tuple, located: tuple, loco: str, business_type: str, zoom_factor: int,
+                           heat: list = None) -> str:
+        """Save the folium map as html and screenshot it in Firefox."""
+        # folium and selenium are only loaded once a map is actually drawn
+        import folium
+        from folium.plugins import HeatMap
+        from selenium import webdriver
+
+        map_center = [center[0], center[1]]
+        my_map = folium.Map(location=map_center, zoom_start=zoom_factor)
+
+        # competitor density under the markers, [lat, lng, weight] per place
+        if heat:
+            HeatMap(heat, name='Competitor density', min_opacity=0.2, radius=20, blur=15).add_to(my_map)
+
+        for lat, lng, count, rating in cluster_points(*located, zoom_factor):
+            rating_text = 'no rating' if rating is None else f'average rating {rating}'
+            if count == 1:
+                folium.Marker(location=[lat, lng], popup=f'1 place, {rating_text}').add_to(my_map)
+                continue
+            size = 30 + min(count, 50) // 5 * 2
+            icon = folium.DivIcon(icon_size=(size, size), icon_anchor=(size // 2, size // 2),
+                                  html=f'<div style="width:{size}px;height:{size}px;line-height:{size}px;'
+                                       f'border-radius:50%;background:rgba(214,62,42,0.85);color:white;'
+                                       f'text-align:center;font-weight:bold;">{count}</div>')
+            folium.Marker(location=[lat, lng], icon=icon, popup=f'{count} places, {rating_text}').add_to(my_map)
+
+        html_file_path = f'{loco}_{business_type}_map.html'
+        save_path = Path('.') / html_file_path
+        my_map.save(save_path)
+
+        driver = webdriver.Firefox()
+        driver.get(f'file://{save_path.resolve()}')
+        sleep(1)
+
+        get_screenshot_path = self.get_screenshot_path(loco, business_type)
+        driver.get_screenshot_as_file(get_screenshot_path)
+
+        driver.quit()
+
+        return str(get_screenshot_path)
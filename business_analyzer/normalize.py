@@ -0,0 +1,63 @@
+import numpy as np
+
+from place import Place
+from utilities import DNE
+
+# servings column name -> Place service flag, in the order the servings report lists them
+SERVICE_COLUMNS = {
+    'breakfast': 'serves_breakfast',
+    'lunch': 'serves_lunch',
+    'brunch': 'serves_brunch',
+    'dinner': 'serves_dinner',
+    'wine': 'serves_wine',
+    'beer': 'serves_beer',
+    'wheelchair': 'wheelchair_accessible_entrance',
+    'vegetarian': 'serves_vegetarian_food',
+    'dine_in': 'dine_in',
+    'takeout': 'takeout',
+    'reservable': 'reservable',
+    'delivery': 'delivery',
+    'curbside_pickup': 'curbside_pickup',
+}
+# tri-state codes used in the services matrix
+TRUE, FALSE, UNKNOWN = 1, 0, -1
+
+
+def encode_flag(flag: bool | None) -> int:
+    """Encodes a tri-state service flag as TRUE, FALSE or UNKNOWN."""
+    if flag is None:
+        return UNKNOWN
+    return TRUE if flag else FALSE
+
+
+class PlaceTable:
+    """Operational places decoded once into columns shared by the hours, servings and rating analyzers.
+
+    Numbers are NumPy arrays with NaN where Google gave no value, text and nested values are lists.
+    """
+
+    def __init__(self, places: list[Place]):
+        self.place_ids = [place.place_id for place in places]
+        # missing text reads as 'DNE' like the getters return, so labels never meet a None
+        self.names = [DNE if place.name is None else place.name for place in places]
+        self.addresses = [DNE if place.address is None else place.address for place in places]
+        self.rating = np.array([np.nan if place.rating is None else place.rating for place in places], dtype=float)
+        self.user_ratings_total = np.array([0 if place.user_ratings_total is None else place.user_ratings_total
+                                            for place in places], dtype=np.int64)
+        self.price_level = np.array([np.nan if place.price_level is None else place.price_level for place in places],
+                                    dtype=float)
+        self.lat = np.array([place.lat for place in places], dtype=float)
+        self.lng = np.array([place.lng for place in places], dtype=float)
+        # N x K matrix, one column per SERVICE_COLUMNS entry
+        self.services = np.array([[encode_flag(getattr(place, flag)) for flag in SERVICE_COLUMNS.values()]
+                                  for place in places], dtype=np.int8).reshape(len(places), len(SERVICE_COLUMNS))
+        self.periods = [place.periods for place in places]
+        self.reviews = [place.reviews for place in places]
+
+    def __len__(self) -> int:
+        return len(self.place_ids)
+
+    @classmethod
+    def from_places(cls, places: dict[str, Place]) -> 'PlaceTable':
+        """Drop businesses the API returns as 'CLOSED_TEMPORARILY' and decode the rest in one pass."""
+        return cls([place for place in places.values() if place.business_status != "CLOSED_TEMPORARILY"])
@@ -0,0 +1,68 @@
+import io
+
+import numpy as np
+
+import utilities as ut
+from place import DAYS, MINUTES_PER_DAY, MINUTES_PER_WEEK, convert_to_military
+
+SLOT_MINUTES = 15
+
+
+class OccupancyIndex:
+    """How many places are open at every minute of the week, built with a sweep-line prefix sum over open intervals."""
+
+    def __init__(self, start: np.ndarray, end: np.ndarray, always_open: int = 0):
+        # intervals that run past Saturday midnight are split into the end and the start of the week
+        wraps = end > MINUTES_PER_WEEK
+        delta = np.bincount(start, minlength=MINUTES_PER_WEEK + 1)
+        delta = delta - np.bincount(np.minimum(end, MINUTES_PER_WEEK), minlength=MINUTES_PER_WEEK + 1)
+        delta[0] = delta[0] + wraps.sum()
+        delta = delta - np.bincount(end[wraps] - MINUTES_PER_WEEK, minlength=MINUTES_PER_WEEK + 1)
+        self.open_count = np.cumsum(delta[:MINUTES_PER_WEEK]) + always_open
+
+    def get_open_at(self, minute: int) -> int:
+        """Returns how many places are open at a minute of the week (0 is Sunday 00:00)."""
+        return int(self.open_count[minute % MINUTES_PER_WEEK])
+
+    def get_coverage(self, slot_minutes: int = SLOT_MINUTES) -> np.ndarray:
+        """Returns the most places open at any point of each slot of the week."""
+        return self.open_count.reshape(-1, slot_minutes).max(axis=1)
+
+    def get_gaps(self, slot_minutes: int = SLOT_MINUTES) -> list:
+        """Returns (start, end) minutes of the week for every stretch of slots where no place is open."""
+        empty = np.concatenate(([False], self.get_coverage(slot_minutes) == 0, [False]))
+        edges = np.flatnonzero(np.diff(empty.astype(np.int8)))
+        gaps = [(int(start) * slot_minutes, int(end) * slot_minutes) for start, end in zip(edges[::2], edges[1::2])]
+        # a gap from late Saturday into early Sunday is one gap, not two
+        if len(gaps) > 1 and gaps[0][0] == 0 and gaps[-1][1] == MINUTES_PER_WEEK:
+            gaps = [(gaps[-1][0], gaps[0][1] + MINUTES_PER_WEEK)] + gaps[1:-1]
+        return gaps
+
+
+def format_minute_of_week(minute: int) -> str:
+    """Formats a minute of the week as 'Day HH:MM AM/PM'."""
+    minute = minute % MINUTES_PER_WEEK
+    return f'{DAYS[minute // MINUTES_PER_DAY]} {ut.convert_time(convert_to_military(minute % MINUTES_PER_DAY))}'
+
+
+def plot_coverage(coverage: np.ndarray, slot_minutes: int = SLOT_MINUTES) -> bytes:
+    """Draws places open per slot across the week and returns it as PNG bytes."""
+    # the object oriented API keeps this off pyplot's global state, so it can run next to the census charts
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 4))
+    ax = fig.add_subplot()
+    hours = np.arange(len(coverage)) * slot_minutes / 60
+    ax.fill_between(hours, coverage, step='post', alpha=0.4, color='blue')
+    ax.step(hours, coverage, where='post', color='blue')
+    ax.set_xticks(np.arange(7) * 24 + 12, DAYS)
+    for day in range(1, 7):
+        ax.axvline(day * 24, color='grey', linewidth=0.5)
+    ax.set_xlim(0, 7 * 24)
+    ax.set_ylim(bottom=0)
+    ax.set_ylabel('Places open')
+    ax.set_title(f'Places Open in Every {slot_minutes} Minutes of the Week')
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
@@ -0,0 +1,45 @@
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class StageRunner:
+    """Runs named stages on a thread pool, each one as soon as the stages it depends on have finished."""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stages = {}
+
+    def add_stage(self, name: str, function, depends_on: list = ()) -> None:
+        """Register a stage, 'function' is called with the results of 'depends_on' in that order."""
+        self.stages[name] = (function, list(depends_on))
+
+    def run_stage(self, name: str, function, args: list):
+        """Run one stage and log how long it took."""
+        logging.info(f'Starting stage: {name}')
+        start = time.perf_counter()
+        result = function(*args)
+        logging.info(f'Finished stage: {name} ({time.perf_counter() - start:.2f}s)')
+        return result
+
+    def run(self) -> dict:
+        """Run every stage and return their results keyed by stage name."""
+        results = {}
+        pending = dict(self.stages)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name, (function, depends_on) in list(pending.items()):
+                    if all(dependency in results for dependency in depends_on):
+                        args = [results[dependency] for dependency in depends_on]
+                        running[executor.submit(self.run_stage, name, function, args)] = name
+                        pending.pop(name)
+
+                if not running:
+                    raise ValueError(f'Stages have missing or circular dependencies: {", ".join(pending)}')
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+
+        return results
@@ -0,0 +1,119 @@
+import json
+from dataclasses import asdict, dataclass
+
+DAYS = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+# service flags are tri-state: True, False or None when Google does not say
+SERVICE_FLAGS = ('serves_breakfast', 'serves_lunch', 'serves_brunch', 'serves_dinner', 'serves_wine', 'serves_beer',
+                 'serves_vegetarian_food', 'delivery', 'curbside_pickup', 'dine_in', 'takeout', 'reservable',
+                 'wheelchair_accessible_entrance')
+
+
+def convert_to_minutes(military_time: str) -> int:
+    """Converts 'HHMM' into minutes after midnight."""
+    return int(military_time[:2]) * 60 + int(military_time[2:])
+
+
+def convert_to_military(minutes: int) -> str:
+    """Converts minutes after midnight into 'HHMM'."""
+    return f'{minutes // 60:02d}{minutes % 60:02d}'
+
+
+def get_periods(opening_hours: dict) -> tuple | None:
+    """Returns opening periods as (open day, open minute, close day, close minute), close is None when open 24/7."""
+    if not isinstance(opening_hours, dict) or 'periods' not in opening_hours:
+        return None
+
+    periods = []
+    for period in opening_hours['periods']:
+        open = period['open']
+        close = period.get('close')
+        if close is None:
+            periods.append((open['day'], convert_to_minutes(open['time']), None, None))
+        else:
+            periods.append((open['day'], convert_to_minutes(open['time']), close['day'], convert_to_minutes(close['time'])))
+    return tuple(periods)
+
+
+@dataclass(slots=True)
+class Place:
+    """One business holding only what the analyzers read, None wherever Google gave no value."""
+    place_id: str
+    name: str | None = None
+    address: str | None = None
+    business_status: str | None = None
+    phone_number: str | None = None
+    website: str | None = None
+    types: tuple = ()
+    rating: float | None = None
+    user_ratings_total: int | None = None
+    price_level: int | None = None
+    lat: float | None = None
+    lng: float | None = None
+    serves_breakfast: bool | None = None
+    serves_lunch: bool | None = None
+    serves_brunch: bool | None = None
+    serves_dinner: bool | None = None
+    serves_wine: bool | None = None
+    serves_beer: bool | None = None
+    serves_vegetarian_food: bool | None = None
+    delivery: bool | None = None
+    curbside_pickup: bool | None = None
+    dine_in: bool | None = None
+    takeout: bool | None = None
+    reservable: bool | None = None
+    wheelchair_accessible_entrance: bool | None = None
+    periods: tuple | None = None
+    # (rating, text, time posted) per review
+    reviews: tuple = ()
+
+    @classmethod
+    def from_details(cls, details: dict) -> 'Place':
+        """Build a place from a Place Details result or a nearby search record."""
+        # json files from older runs pad missing keys with "DNE"
+        details = {key: value for key, value in details.items() if value != "DNE"}
+        location = details.get('geometry', {}).get('location', {})
+        reviews = tuple((review['rating'], review['text'], review.get('time', 0))
+                        for review in details.get('reviews', ()) if isinstance(review, dict))
+        return cls(place_id=details['place_id'],
+                   name=details.get('name'),
+                   # nearby search records only carry the shorter vicinity address
+                   address=details.get('formatted_address', details.get('vicinity')),
+                   business_status=details.get('business_status'),
+                   phone_number=details.get('formatted_phone_number'),
+                   website=details.get('website'),
+                   types=tuple(details.get('types', ())),
+                   rating=details.get('rating'),
+                   user_ratings_total=details.get('user_ratings_total'),
+                   price_level=details.get('price_level'),
+                   lat=location.get('lat'),
+                   lng=location.get('lng'),
+                   periods=get_periods(details.get('opening_hours')),
+                   reviews=reviews,
+                   **{flag: details.get(flag) for flag in SERVICE_FLAGS})
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Place':
+        """Build a place back from to_dict output, json turns its tuples into lists."""
+        place = cls(**data)
+        place.types = tuple(place.types)
+        place.reviews = tuple(tuple(review) for review in place.reviews)
+        if place.periods is not None:
+            place.periods = tuple(tuple(period) for period in place.periods)
+        return place
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def save_places(places: dict, file: str) -> None:
+    """Write {place_id: Place} to a json file."""
+    with open(file, 'w') as f:
+        json.dump({place_id: place.to_dict() for place_id, place in places.items()}, f, indent=4)
+
+
+def load_places(file: str) -> dict:
+    """Read {place_id: Place} back from a json file written by save_places."""
+    with open(file, 'r') as f:
+        return {place_id: Place.from_dict(data) for place_id, data in json.load(f).items()}
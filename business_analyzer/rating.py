@@ -1,73 +1,76 @@
-import json
-import os
-from docx import Document
-import pandas as pd
-import numpy as np
-import argparse
-import data as gd
 import heapq
-from datetime import datetime
-import torch
-from transformers import AutoTokenizer, AutoModelWithLMHead
+
+import numpy as np
 
 import utilities as ut
+from normalize import PlaceTable
+
+# bad reviews are 1-2 stars, good reviews are above 2 stars
+BAD_BELOW = 3
+GOOD_ABOVE = 2
+# ways to rank reviews within a bucket, the highest score is shown first
+RANK_KEYS = {
+    'recency': lambda rating, text, time: time,
+    'length': lambda rating, text, time: len(text),
+    'rating': lambda rating, text, time: rating,
+}
 
 class Rating:
+    getters = (ut.get_rating, ut.get_reviews)
 
-    def get_average_rating(self, details: dict) -> tuple:
+    def __init__(self, k: int = 5, rank: str = 'recency'):
+        if rank not in RANK_KEYS:
+            raise ValueError(f'Unknown review ranking {rank}, expected one of {", ".join(RANK_KEYS)}')
+        if k < 0:
+            raise ValueError(f'Number of reviews to quote must be 0 or more, got {k}')
+        self.k = k
+        self.rank = rank
+
+    def get_average_rating(self, table: PlaceTable) -> tuple:
         """Return average rating (out of 5) of all places."""
-        total = 0
-        for place in details:
-            rating = ut.get_rating(details[place])
-            if rating != "DNE":
-                total = total + float(rating)
-        
-        return (len(details), round((total / len(details)), 2))
+        # places without a rating still count towards the number of places
+        total = np.nansum(table.rating)
+        return (len(table), round(float(total / len(table)), 2))
     
-    def analyze_ratings(self, details: dict, flag: str) -> list:
-        """Return either 5 good or bad reviews from places."""
-        threshold = 2
-        if flag == "bad":
-            threshold = 3
-        
-        total_ratings = []
-        for place in details:
-            total_ratings = total_ratings + ut.get_reviews(details[place])
-        
-        if flag == "bad":
-            ratings = [(rating, text) for rating, text in total_ratings if rating < threshold]
-            # one_stars = [(rating, text) for rating, text in ratings if rating == 1]
-            suggestions = []
-
-            for rating in ratings:
-                if len(ratings) < 5:
-                    suggestions.append(rating[1])
-                else:
-                    suggestions.append(rating[1])
+    def select_reviews(self, table: PlaceTable) -> tuple:
+        """Return the top k bad and good reviews of all places in one pass, keeping only k reviews per bucket."""
+        rank = RANK_KEYS[self.rank]
+        bad, good = [], []
+        order = 0
+        for reviews in table.reviews:
+            for rating, text, time in reviews:
+                # earlier reviews win ties, so a later review needs a strictly better score to get in
+                order -= 1
+                if rating < BAD_BELOW:
+                    # the lowest rating is the most telling bad review
+                    score = -rating if self.rank == 'rating' else rank(rating, text, time)
+                    self.push_review(bad, (score, order, text))
+                if rating > GOOD_ABOVE:
+                    self.push_review(good, (rank(rating, text, time), order, text))
 
-            # If the list is larger than 5, keep only the first 5 elements
-            suggestions = suggestions[:5]
-            return suggestions
-        else:
-            ratings = [(rating, text) for rating, text in total_ratings if rating > threshold]
-            # five_stars = [(ratings, text) for rating, text in ratings if rating == 5]
-            suggestions = []
+        return ([text for score, order, text in sorted(bad, reverse=True)],
+                [text for score, order, text in sorted(good, reverse=True)])
 
-            for rating in ratings:
-                if len(ratings) < 5:
-                    suggestions.append(rating[1])
-                else:
-                    suggestions.append(rating[1])
+    def push_review(self, heap: list, review: tuple) -> None:
+        """Keep review in the min-heap of the k best ranked reviews so far."""
+        if len(heap) < self.k:
+            heapq.heappush(heap, review)
+        # with k of 0 the heap stays empty and nothing is quoted
+        elif heap and review > heap[0]:
+            heapq.heapreplace(heap, review)
 
-            # If the list is larger than 5, keep only the first 5 elements
-            suggestions = suggestions[:5]
-            return suggestions
+    def analyze_ratings(self, table: PlaceTable, flag: str) -> list:
+        """Return either the top k good or bad reviews from places."""
+        bad, good = self.select_reviews(table)
+        return bad if flag == "bad" else good
 
-    def rating_report(self, details: dict) -> list:
+    def rating_report(self, table: PlaceTable) -> list:
         """Return average ratings and good/bad reviews"""
-        details = ut.delete_non_operational_businesses(details)
-        average_rating = self.get_average_rating(details)
-        bad_ratings = self.analyze_ratings(details, "bad")
-        good_ratings = self.analyze_ratings(details, "good")
+        average_rating = self.get_average_rating(table)
+        bad_ratings, good_ratings = self.select_reviews(table)
+
+        return [average_rating, bad_ratings, good_ratings]
 
-        return [average_rating, bad_ratings, good_ratings]
\ No newline at end of file
+    def rating_summary_report(self, table: PlaceTable) -> list:
+        """Return average rating only, good/bad reviews are None since the fast tier has no reviews."""
+        return [self.get_average_rating(table), None, None]
\ No newline at end of file
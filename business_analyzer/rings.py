@@ -0,0 +1,85 @@
+import argparse
+
+import numpy as np
+
+from hours import WeeklyHours
+from normalize import PlaceTable, SERVICE_COLUMNS, TRUE
+from servings import PRICE_LABEL, SERVICE_LABELS
+from spatial import get_distances_in_miles
+
+METERS_PER_MILE = 1609
+
+
+def parse_rings(value: str) -> list:
+    """Parses comma separated ring radii in miles, i.e. '1,2,5', into a sorted list.
+
+    Raises argparse.ArgumentTypeError, which argparse shows as is, since the value comes from --rings.
+    """
+    try:
+        rings = sorted({float(ring) for ring in value.split(',') if ring.strip()})
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Rings must be comma separated miles, got {value}') from None
+    if not rings or rings[0] <= 0:
+        raise argparse.ArgumentTypeError(f'Rings must be positive miles, got {value}')
+    return rings
+
+
+def get_prefix_sums(values: np.ndarray) -> np.ndarray:
+    """Returns running totals along the first axis with a leading zero, so row n is the total of the first n rows."""
+    values = np.asarray(values, dtype=float)
+    return np.concatenate((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+
+
+def get_average(totals: np.ndarray, counts: np.ndarray, digits: int = None) -> list:
+    """Returns totals / counts per ring, None where a ring has nothing to average."""
+    return [None if count == 0 else float(total / count) if digits is None else round(float(total / count), digits)
+            for total, count in zip(totals, counts)]
+
+
+class AnalyzeRings:
+    """Compares catchments of growing radius around the search center from one fetch at the largest radius.
+
+    Places are sorted by distance once, so every ring is a prefix of the next one and each statistic is read off
+    one running total per column at the ring sizes.
+    """
+
+    def __init__(self, rings: list):
+        self.rings = rings
+
+    def get_ring_sizes(self, table: PlaceTable, center: tuple) -> tuple:
+        """Returns place indexes sorted by distance from center and the number of places within each ring."""
+        distances = get_distances_in_miles(table.lat, table.lng, center[0], center[1])
+        # places without coordinates sort last as NaN and fall outside every ring
+        by_distance = np.argsort(distances, kind='stable')
+        sizes = np.searchsorted(distances[by_distance], self.rings, side='right')
+        return (by_distance, sizes)
+
+    def get_hours_stats(self, table: PlaceTable, by_distance: np.ndarray, sizes: np.ndarray) -> dict:
+        """Returns {statistic: value per ring} for opening hours, averaged over places with known, limited hours."""
+        week = WeeklyHours(table.periods)
+        analyzed = (week.has_hours & ~week.always_open)[by_distance]
+        minutes = get_prefix_sums(np.where(analyzed, week.total_minutes[by_distance], 0))[sizes]
+        return {'Average hours open per week': get_average(minutes / 60, get_prefix_sums(analyzed)[sizes], 2),
+                'Open 24/7': [int(count) for count in get_prefix_sums(week.always_open[by_distance])[sizes]]}
+
+    def get_service_stats(self, table: PlaceTable, by_distance: np.ndarray, sizes: np.ndarray) -> dict:
+        """Returns {label: percent of places offering it per ring} for every service."""
+        offered = get_prefix_sums(table.services[by_distance] == TRUE)[sizes] * 100
+        return {SERVICE_LABELS[column]: get_average(offered[:, index], sizes)
+                for index, column in enumerate(SERVICE_COLUMNS)}
+
+    def analyze_rings_report(self, table: PlaceTable, center: tuple, summary: bool = False) -> list:
+        """Returns (ring in miles, stats) for every ring, summary leaves out what needs place details."""
+        by_distance, sizes = self.get_ring_sizes(table, center)
+        # places without a rating still count towards the number of places
+        ratings = get_prefix_sums(np.nan_to_num(table.rating[by_distance]))[sizes]
+        stats = {'Businesses': [int(size) for size in sizes],
+                 'Average rating (out of 5)': get_average(ratings, sizes, 2)}
+        if not summary:
+            stats.update(self.get_hours_stats(table, by_distance, sizes))
+            stats.update(self.get_service_stats(table, by_distance, sizes))
+        price = table.price_level[by_distance]
+        known = ~np.isnan(price)
+        stats[PRICE_LABEL] = get_average(get_prefix_sums(np.nan_to_num(price))[sizes], get_prefix_sums(known)[sizes])
+        return [(ring, {statistic: values[index] for statistic, values in stats.items()})
+                for index, ring in enumerate(self.rings)]
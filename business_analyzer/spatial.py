@@ -0,0 +1,127 @@
+import numpy as np
+
+# same earth radius as utilities.get_distance_in_miles
+EARTH_RADIUS_MILES = 3956
+MILES_PER_DEGREE = np.radians(1) * EARTH_RADIUS_MILES
+DEFAULT_CELL_MILES = 0.25
+# places per distance matrix when searching for nearest neighbours
+NEAREST_CHUNK = 512
+
+
+def get_distances_in_miles(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """Haversine distance in miles between coordinates in degrees, broadcasting like any NumPy operation."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1)))
+
+
+class SpatialIndex:
+    """Places bucketed into square grid cells so neighbourhood queries only look at nearby cells.
+
+    Coordinates are projected onto a flat plane around the mean latitude, which is accurate to well under a
+    percent across a metro area. Places without coordinates are left out of every query, results are indexes
+    into the arrays the index was built from.
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, cell_miles: float = DEFAULT_CELL_MILES):
+        self.lat = np.asarray(lat, dtype=float)
+        self.lng = np.asarray(lng, dtype=float)
+        self.cell_miles = cell_miles
+        self.points = np.flatnonzero(np.isfinite(self.lat) & np.isfinite(self.lng))
+
+        located = len(self.points) > 0
+        self.origin = (float(self.lat[self.points].min()), float(self.lng[self.points].min())) if located else (0.0, 0.0)
+        self.lng_scale = np.cos(np.radians(self.lat[self.points].mean())) if located else 1.0
+        self.x, self.y = self.project(self.lat[self.points], self.lng[self.points])
+
+        self.rows = (self.y // cell_miles).astype(np.int64)
+        self.cols = (self.x // cell_miles).astype(np.int64)
+        self.row_count = int(self.rows.max()) + 1 if located else 0
+        self.col_count = int(self.cols.max()) + 1 if located else 0
+        # points sorted by cell, a row of cells is then one contiguous run of keys
+        keys = self.rows * self.col_count + self.cols
+        self.order = np.argsort(keys, kind='stable')
+        self.sorted_keys = keys[self.order]
+
+    def project(self, lat: np.ndarray, lng: np.ndarray) -> tuple:
+        """Returns (x, y) in miles east and north of the south west corner of the places."""
+        return ((np.asarray(lng) - self.origin[1]) * MILES_PER_DEGREE * self.lng_scale,
+                (np.asarray(lat) - self.origin[0]) * MILES_PER_DEGREE)
+
+    def get_block(self, row: int, col: int, reach: int) -> np.ndarray:
+        """Returns positions in self.points of places within reach cells of a cell, in both directions."""
+        first_col = max(col - reach, 0)
+        last_col = min(col + reach, self.col_count - 1)
+        if first_col > last_col:
+            return np.empty(0, dtype=np.int64)
+        rows = np.arange(max(row - reach, 0), min(row + reach, self.row_count - 1) + 1)
+        starts = np.searchsorted(self.sorted_keys, rows * self.col_count + first_col, side='left')
+        ends = np.searchsorted(self.sorted_keys, rows * self.col_count + last_col, side='right')
+        return np.concatenate([self.order[start:end] for start, end in zip(starts, ends)] or [np.empty(0, dtype=np.int64)])
+
+    def get_distances(self, center: tuple) -> np.ndarray:
+        """Returns the distance in miles of every place from center, NaN where a place has no coordinates."""
+        return get_distances_in_miles(self.lat, self.lng, center[0], center[1])
+
+    def query_radius(self, center: tuple, radius_miles: float) -> np.ndarray:
+        """Returns indexes of places within radius_miles of center, in index order."""
+        if len(self.points) == 0:
+            return np.empty(0, dtype=np.int64)
+        x, y = self.project(center[0], center[1])
+        # one extra cell absorbs the flat projection error at the edge of the radius
+        reach = int(np.ceil(radius_miles / self.cell_miles)) + 1
+        block = self.get_block(int(y // self.cell_miles), int(x // self.cell_miles), reach)
+        candidates = self.points[block]
+        inside = get_distances_in_miles(self.lat[candidates], self.lng[candidates], center[0], center[1]) <= radius_miles
+        return np.sort(candidates[inside])
+
+    def get_nearest_distances(self, k: int = 1) -> np.ndarray:
+        """Returns an N x k array of flat distances in miles from every place to its k nearest other places.
+
+        Rows are NaN for places without coordinates and padded with NaN when there are fewer than k other places.
+        """
+        nearest = np.full((len(self.lat), k), np.nan)
+        if len(self.points) < 2:
+            return nearest
+
+        cell_starts = np.flatnonzero(np.r_[True, self.sorted_keys[1:] != self.sorted_keys[:-1]])
+        cell_ends = np.r_[cell_starts[1:], len(self.sorted_keys)]
+        for start, end in zip(cell_starts, cell_ends):
+            # a crowded cell is done in chunks to bound the size of the distance matrix
+            for chunk in range(start, end, NEAREST_CHUNK):
+                members = self.order[chunk:min(chunk + NEAREST_CHUNK, end)]
+                distances = self.get_cell_nearest(members, k)
+                nearest[self.points[members], :distances.shape[1]] = distances
+        return nearest
+
+    def get_cell_nearest(self, members: np.ndarray, k: int) -> np.ndarray:
+        """Returns sorted distances from places sharing one cell to their k nearest others, widening the search until exact."""
+        row, col = int(self.rows[members[0]]), int(self.cols[members[0]])
+        max_reach = max(self.row_count, self.col_count)
+        reach = 1
+        while True:
+            block = self.get_block(row, col, reach)
+            distances = np.hypot(self.x[members, None] - self.x[block], self.y[members, None] - self.y[block])
+            # a place is not its own competitor
+            distances[members[:, None] == block] = np.inf
+            found = min(k, len(block) - 1)
+            distances = np.sort(np.partition(distances, found - 1, axis=1)[:, :found], axis=1) if found > 0 else distances[:, :0]
+            # everything outside the block is more than reach cells away, so what was found so far is final
+            if reach >= max_reach or (found == k and distances[:, -1].max() <= reach * self.cell_miles):
+                return distances
+            reach = reach * 2
+
+    def get_cell_counts(self) -> np.ndarray:
+        """Returns how many places share each place's grid cell, itself included, 0 where a place has no coordinates."""
+        counts = np.zeros(len(self.lat), dtype=np.int64)
+        keys, inverse, cell_counts = np.unique(self.sorted_keys, return_inverse=True, return_counts=True)
+        counts[self.points[self.order]] = cell_counts[inverse]
+        return counts
+
+    def get_density(self) -> tuple:
+        """Returns (lat, lng, places per square mile) of the centre of every cell holding at least one place."""
+        keys, cell_counts = np.unique(self.sorted_keys, return_counts=True)
+        rows, cols = np.divmod(keys, max(self.col_count, 1))
+        lat = self.origin[0] + (rows + 0.5) * self.cell_miles / MILES_PER_DEGREE
+        lng = self.origin[1] + (cols + 0.5) * self.cell_miles / (MILES_PER_DEGREE * self.lng_scale)
+        return (lat, lng, cell_counts / self.cell_miles ** 2)
@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+
+MAPPING_FILE = 'state_county_mapping.json'
+
+
+class CodeLookupError(LookupError):
+    """Raised when a state or county name or code is not in the state/county mapping."""
+
+
+class StateCountyIndex:
+    """Name to code and code to name lookups for states and their counties, built from state_county_mapping.json."""
+
+    def __init__(self, mapping: dict):
+        self.state_codes = {state: data['CODE'] for state, data in mapping.items()}
+        self.state_names = {code: state for state, code in self.state_codes.items()}
+        self.county_codes = {state: dict(data['COUNTIES']) for state, data in mapping.items()}
+        self.county_names = {state: {code: county for county, code in counties.items()}
+                             for state, counties in self.county_codes.items()}
+
+    def get_state_code(self, state: str) -> str:
+        """Return the FIPS code of a state name."""
+        try:
+            return self.state_codes[state]
+        except KeyError:
+            raise CodeLookupError(f'No state named {state}') from None
+
+    def get_state_name(self, code: str) -> str:
+        """Return the state name of a FIPS code."""
+        try:
+            return self.state_names[code]
+        except KeyError:
+            raise CodeLookupError(f'No state with code {code}') from None
+
+    def get_county_code(self, state: str, county: str) -> str:
+        """Return the FIPS code of a county name within a state name."""
+        try:
+            return self.county_codes[state][county]
+        except KeyError:
+            raise CodeLookupError(f'No county named {county} in {state}') from None
+
+    def get_county_name(self, state: str, code: str) -> str:
+        """Return the county name of a county FIPS code within a state name."""
+        try:
+            return self.county_names[state][code]
+        except KeyError:
+            raise CodeLookupError(f'No county with code {code} in {state}') from None
+
+
+def get_binary_path(file: str) -> Path:
+    """Return where the precompiled index for a mapping file lives."""
+    return Path(file).with_suffix('.pickle')
+
+
+def get_source_stamp(file: str) -> tuple:
+    """Return (size, mtime) of the mapping file, stored with the precompiled index to spot a stale one."""
+    stat = os.stat(file)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def write_binary_index(file: str = MAPPING_FILE) -> StateCountyIndex:
+    """Build the index from the json mapping and save its precompiled form next to it."""
+    with open(file, "r") as f:
+        index = StateCountyIndex(json.load(f))
+    try:
+        with open(get_binary_path(file), "wb") as f:
+            pickle.dump((get_source_stamp(file), index), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as error:
+        logging.info(f'Unable to save precompiled state/county index: {error}')
+    return index
+
+
+@lru_cache(maxsize=None)
+def get_index(file: str = MAPPING_FILE) -> StateCountyIndex:
+    """Return the process-wide index for a mapping file, loaded once from its precompiled form when it is current."""
+    try:
+        with open(get_binary_path(file), "rb") as f:
+            stamp, index = pickle.load(f)
+        if stamp == get_source_stamp(file):
+            return index
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+    return write_binary_index(file)
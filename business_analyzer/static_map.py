@@ -0,0 +1,173 @@
+from pathlib import Path
+
+import numpy as np
+
+from density import DensityGrid
+
+TILE_SIZE = 256
+# web mercator ground resolution at zoom 0 on the equator
+METERS_PER_PIXEL = 156543.03392
+MAX_ZOOM = 19
+TILE_SUFFIXES = ('.png', '.jpg', '.jpeg')
+# (width, height) in pixels
+STATIC_MAP_SIZE = (1200, 800)
+
+
+def project(lat, lng, zoom: int) -> tuple:
+    """Returns web mercator (x, y) pixel coordinates of lat/lng at a zoom level, y grows southwards like map tiles."""
+    scale = TILE_SIZE * 2 ** zoom
+    x = (np.asarray(lng, dtype=float) + 180) / 360 * scale
+    sin_lat = np.sin(np.radians(np.clip(np.asarray(lat, dtype=float), -85.0511, 85.0511)))
+    y = (0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * np.pi)) * scale
+    return (x, y)
+
+
+def get_meters_per_pixel(lat: float, zoom: int) -> float:
+    return METERS_PER_PIXEL * np.cos(np.radians(lat)) / 2 ** zoom
+
+
+def get_fit_zoom(lat: float, radius: float, size: tuple) -> int:
+    """Returns the closest zoom at which a circle of radius meters fits in an image of size (width, height) pixels."""
+    fit = min(size) * 0.45
+    for zoom in range(MAX_ZOOM, -1, -1):
+        if radius / get_meters_per_pixel(lat, zoom) <= fit:
+            return zoom
+    return 0
+
+
+def find_tile(tile_dir: Path, zoom: int, x: int, y: int) -> Path | None:
+    """Returns the cached tile for zoom/x/y, laid out as tile_dir/zoom/x/y.png like most tile servers and caches."""
+    for suffix in TILE_SUFFIXES:
+        path = tile_dir / str(zoom) / str(x) / f'{y}{suffix}'
+        if path.exists():
+            return path
+    return None
+
+
+def get_bounds(center: tuple, zoom: int, size: tuple = STATIC_MAP_SIZE) -> tuple:
+    """Returns (left, top, right, bottom) pixels of an image of size (width, height) centered on center at zoom."""
+    center_x, center_y = project(center[0], center[1], zoom)
+    width, height = size
+    return (center_x - width / 2, center_y - height / 2, center_x + width / 2, center_y + height / 2)
+
+
+def find_tiles(tile_dir: Path, zoom: int, bounds: tuple) -> list:
+    """Returns (tile x, tile y, path) of every cached tile overlapping bounds (left, top, right, bottom in pixels)."""
+    left, top, right, bottom = bounds
+    tiles = []
+    tile_count = 2 ** zoom
+    for tile_x in range(int(left // TILE_SIZE), int(right // TILE_SIZE) + 1):
+        for tile_y in range(max(int(top // TILE_SIZE), 0), min(int(bottom // TILE_SIZE), tile_count - 1) + 1):
+            path = find_tile(tile_dir, zoom, tile_x % tile_count, tile_y)
+            if path is not None:
+                tiles.append((tile_x, tile_y, path))
+    return tiles
+
+
+def get_tiles_fingerprint(tile_dir: Path, zoom: int, bounds: tuple) -> list:
+    """Returns (path, modified time, size) of the tiles a map within bounds is drawn from, so new tiles redraw it."""
+    fingerprint = []
+    for tile_x, tile_y, path in find_tiles(tile_dir, zoom, bounds):
+        stat = path.stat()
+        fingerprint.append((str(path.relative_to(tile_dir)), stat.st_mtime_ns, stat.st_size))
+    return fingerprint
+
+
+def draw_tiles(ax, tile_dir: Path, zoom: int, bounds: tuple) -> int:
+    """Draws every cached tile overlapping bounds (left, top, right, bottom in pixels), returns how many were found."""
+    from matplotlib.image import imread
+
+    tiles = find_tiles(tile_dir, zoom, bounds)
+    for tile_x, tile_y, path in tiles:
+        extent = (tile_x * TILE_SIZE, (tile_x + 1) * TILE_SIZE, (tile_y + 1) * TILE_SIZE, tile_y * TILE_SIZE)
+        ax.imshow(imread(path), extent=extent, interpolation='bilinear', zorder=0)
+    return len(tiles)
+
+
+def draw_density(ax, density: DensityGrid, zoom: int, threshold: float = 0.05) -> None:
+    """Draws the density surface over the basemap, cells under threshold of the peak are left clear."""
+    from matplotlib import colormaps
+
+    peak = density.values.max()
+    if peak <= 0:
+        return
+    west, east, south, north = density.extent
+    left, bottom = project(south, west, zoom)
+    right, top = project(north, east, zoom)
+    values = density.values / peak
+    colors = colormaps['hot_r'](values)
+    # fades in from threshold so the basemap shows through where there is little competition
+    colors[..., 3] = 0.6 * np.clip((values - threshold) / (1 - threshold), 0, 1) ** 0.5
+    # grid rows are evenly spaced in latitude, which is as good as mercator pixels across a search area
+    ax.imshow(colors, origin='lower', extent=(left, right, bottom, top), interpolation='bilinear', zorder=1)
+
+
+def add_rating_legend(fig) -> None:
+    """Adds a small colour bar in the lower left corner explaining the marker colours."""
+    from matplotlib import colormaps
+    from matplotlib.cm import ScalarMappable
+    from matplotlib.colors import Normalize
+
+    cax = fig.add_axes((0.03, 0.06, 0.22, 0.02))
+    colorbar = fig.colorbar(ScalarMappable(Normalize(1, 5), colormaps['RdYlGn']), cax=cax, orientation='horizontal')
+    colorbar.set_label('Average rating', fontsize=9)
+    colorbar.ax.tick_params(labelsize=8)
+
+
+def render_static_map(center: tuple, clusters: list, radius: float, path: Path, zoom: int, tile_dir: str = None,
+                      size: tuple = STATIC_MAP_SIZE, density: DensityGrid = None) -> Path:
+    """Draws place clusters, the search center and the search radius to a PNG at path without a browser or network.
+
+    clusters are (lat, lng, number of places, average rating) at zoom, markers are coloured by average rating and a
+    cluster of several places is drawn larger with its count and average rating on it. Basemap tiles are read from
+    tile_dir when given, missing tiles leave a plain background. The competitor density is drawn under the markers
+    when given.
+    """
+    from matplotlib import colormaps
+    from matplotlib.colors import Normalize
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Circle
+
+    center_x, center_y = project(center[0], center[1], zoom)
+    width, height = size
+    bounds = get_bounds(center, zoom, size)
+
+    dpi = 100
+    fig = Figure(figsize=(width / dpi, height / dpi), dpi=dpi)
+    ax = fig.add_axes((0, 0, 1, 1))
+    ax.set_xlim(bounds[0], bounds[2])
+    # pixel rows grow southwards
+    ax.set_ylim(bounds[3], bounds[1])
+    ax.set_axis_off()
+    ax.set_facecolor('#f2efe9')
+    fig.patch.set_facecolor('#f2efe9')
+
+    if tile_dir is not None:
+        draw_tiles(ax, Path(tile_dir), zoom, bounds)
+    if density is not None:
+        draw_density(ax, density, zoom)
+
+    ax.add_patch(Circle((center_x, center_y), radius / get_meters_per_pixel(center[0], zoom), fill=True,
+                        facecolor=(0.2, 0.4, 0.9, 0.08), edgecolor=(0.2, 0.4, 0.9), linewidth=2, zorder=1))
+    if clusters:
+        lat, lng, counts, ratings = zip(*clusters)
+        x, y = project(lat, lng, zoom)
+        counts = np.array(counts)
+        rated = np.array([rating is not None for rating in ratings])
+        # markers are coloured by average rating, grey where no place in the cluster has one
+        colors = np.array(colormaps['RdYlGn'](Normalize(1, 5)(np.array(ratings, dtype=float))))
+        colors[~rated] = (0.55, 0.55, 0.55, 1)
+        ax.scatter(x, y, s=np.where(counts > 1, 500 + 80 * np.sqrt(counts - 1), 70), c=colors,
+                   edgecolors='#333333', linewidths=1, zorder=2)
+        for cluster_x, cluster_y, count, rating in zip(x, y, counts, ratings):
+            if count > 1:
+                label = str(count) if rating is None else f'{count}\n{rating:.1f}\u2605'
+                ax.text(cluster_x, cluster_y, label, ha='center', va='center', color='black', fontsize=8,
+                        fontweight='bold', linespacing=1.1, zorder=3)
+        add_rating_legend(fig)
+    ax.scatter([center_x], [center_y], s=250, marker='*', color='#1f3fbf', edgecolors='white', zorder=4)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig.savefig(path, format='png', dpi=dpi)
+    return path
@@ -1,13 +1,17 @@
 from datetime import datetime
-import data as gd
 import re
 from math import radians, cos, sin, asin, sqrt
 
+from place import Place, convert_to_military
+
+# custom tag for values Google does not define
+DNE = "DNE"
+
 def delete_non_operational_businesses(details: dict) -> dict:
     """Returns rid of any businesses that API returns as 'CLOSED_TEMPORARILY' and returns new dictionary. """
     new_details = {}
     for key, value in details.items():
-        if value['business_status'] != "CLOSED_TEMPORARILY":
+        if get_business_status(value) != "CLOSED_TEMPORARILY":
             new_details[key] = value
 
     return new_details
@@ -32,7 +36,7 @@ def filter_out_chains(details: dict) -> dict:
     chains = ["McDonald's", "Dunkin'", "Panera Bread", "Starbucks", "Barnes & Noble"]
     new_details = {}
     for place in details:
-        if gd.get_name(details[place]) not in chains:
+        if get_name(details[place]) not in chains:
             new_details[place] = details[place]
 
     return new_details
@@ -41,105 +45,112 @@ def convert_meters_to_miles(radius: float) -> float:
     """Converts meters to miles."""
     return round(radius / 1609, 2)
 
-def validate_data_key(data: dict, key: str) -> str | list:
-    """Makes sure that key exists in dictionary."""
-    if key in data:
-        return data[key]
-    else:
+def validate_data_key(data: Place, key: str) -> str | list:
+    """Makes sure that the place has the field, returns 'DNE' where Google gave no value."""
+    if not hasattr(data, key):
         raise KeyError(f"Error: no {key} found.")
+    value = getattr(data, key)
+    return DNE if value is None else value
 
-def get_business_status(data: dict) -> str | list:
+def get_business_status(data: Place) -> str | list:
     """Returns business_status value from data."""
     return validate_data_key(data, 'business_status')
 
-def get_address(data: dict) -> str | list:
+def get_address(data: Place) -> str | list:
     """Returns formatted_address values from data."""
-    return validate_data_key(data, 'formatted_address')
+    return validate_data_key(data, 'address')
 
-def get_phone_number(data: dict) -> str | list:
+def get_phone_number(data: Place) -> str | list:
     """Returns formatted_phone_number values from data."""
-    return validate_data_key(data, 'formatted_phone_number')
+    return validate_data_key(data, 'phone_number')
 
-def get_delivery(data: dict) -> str | list:
+def get_delivery(data: Place) -> str | list:
     """Returns delivery values from data."""
     return validate_data_key(data, 'delivery')
 
-def get_dine_in(data: dict) -> str | list:
+def get_curbside_pickup(data: Place) -> str | list:
+    """Returns curbside_pickup values from data."""
+    return validate_data_key(data, 'curbside_pickup')
+
+def get_dine_in(data: Place) -> str | list:
     """Returns dine_in values from data."""
     return validate_data_key(data, 'dine_in')
 
-def get_name(data: dict) -> str | list:
+def get_name(data: Place) -> str | list:
     """Returns name values from data."""
     return validate_data_key(data, 'name')
 
-def get_place_id(data: dict) -> str | list:
+def get_place_id(data: Place) -> str | list:
     """Returns place_id values from data."""
     return validate_data_key(data, 'place_id')
 
-def get_rating(data: dict) -> str | list:
+def get_rating(data: Place) -> str | list:
     """Returns rating values from data."""
     return validate_data_key(data, 'rating')
 
-def get_reservable(data: dict) -> str | list:
+def get_user_ratings_total(data: Place) -> str | int:
+    """Returns user_ratings_total value from data."""
+    return validate_data_key(data, 'user_ratings_total')
+
+def get_reservable(data: Place) -> str | list:
     """Returns reservable values from data."""
     return validate_data_key(data, 'reservable')
 
-def get_meals(data: dict) -> str | list:
+def get_meals(data: Place) -> str | list:
     """Returns serves_breakfast, serves_lunch, serves_brunch, and serves_dinner values from data."""
     return [validate_data_key(data, 'serves_breakfast'), validate_data_key(data, 'serves_lunch'), validate_data_key(data, 'serves_brunch'), validate_data_key(data, 'serves_dinner')]
 
-def get_beer(data: dict) -> str | list:
+def get_beer(data: Place) -> str | list:
     """Returns serves_beer values from data."""
     return validate_data_key(data, 'serves_beer')
 
-def get_types(data: dict) -> str | list:
+def get_types(data: Place) -> str | list:
     """Returns types value from data."""
-    return validate_data_key(data, 'types')
+    return list(validate_data_key(data, 'types'))
 
-def get_website(data: dict) -> str | list:
+def get_website(data: Place) -> str | list:
     """Returns website value from data."""
     return validate_data_key(data, 'website')
 
-def get_wine(data: dict) -> str | list:
+def get_wine(data: Place) -> str | list:
     """Returns serves_wine value from data."""
     return validate_data_key(data, 'serves_wine')
 
-def get_vegetarian(data: dict) -> str | list:
+def get_vegetarian(data: Place) -> str | list:
     """Returns serves_vegatarian_food value from data."""
     return validate_data_key(data, 'serves_vegetarian_food')
 
-def get_price_level(data: dict) -> str | list:
+def get_price_level(data: Place) -> str | list:
     """Returns price_level value from data."""
     return validate_data_key(data, 'price_level')
 
-def get_takeout(data: dict) -> str | list:
+def get_takeout(data: Place) -> str | list:
     """Returns takeout value from data."""
     return validate_data_key(data, 'takeout')
 
-def get_wheelchair_accessible(data: dict) -> str | list:
+def get_wheelchair_accessible(data: Place) -> str | list:
     """Returns wheelchair_accessible_entrance value from data."""
     return validate_data_key(data, 'wheelchair_accessible_entrance')
 
-def get_opening_hours(data: dict) -> dict:
+def get_opening_hours(data: Place) -> dict:
     """Returns opening_hours from data if exists and formats data."""
-    try:
-        open_close = validate_data_key(data, 'opening_hours.periods')
-        if open_close == "DNE":
-            return "DNE"
-    except KeyError as error:
-        print(error)
+    return format_opening_hours(validate_data_key(data, 'periods'))
 
+def format_opening_hours(open_close: tuple | str) -> dict:
+    """Formats Place periods into {day: (open, close)}, 0 for closed days and ("2424", "2424") when open 24/7."""
+    if open_close == "DNE" or open_close is None:
+        return "DNE"
 
     days = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
     final_times = {index: 0 for index in range(0,7)}
 
-    for time in open_close:
-        if len(time) == 1:
-            final_times[time['open']['day']] = ("2424", "2424") # means that place is open 24/7
+    for open_day, open_minute, close_day, close_minute in open_close:
+        if close_day is None:
+            final_times[open_day] = ("2424", "2424") # means that place is open 24/7
         else:
-            open = time['open']['time']
-            close = time['close']['time']
-            final_times[time['close']['day']] = (open, close)
+            open = convert_to_military(open_minute)
+            close = convert_to_military(close_minute)
+            final_times[close_day] = (open, close)
     # maps day titles to numbers
     final_times = {day: final_times[key] for day, key in zip(days, range(0,7))}
     return final_times
@@ -150,22 +161,9 @@ def get_zip_code(address) -> str:
     zip = re.sub(r'\D', '', address_list[2])
     return zip
 
-def get_reviews(data: dict) -> dict:
-    """Returns reviews values from data and formats into new dictionary."""
-    try:
-        reviews = validate_data_key(data, 'reviews')
-    except KeyError as error:
-        print(error)
-
-
-    full_reviews = []
-    for review in reviews:
-
-        if isinstance(review, dict):
-            complete = (review['rating'], review['text'])
-            full_reviews.append(complete)
-
-    return full_reviews
+def get_reviews(data: Place) -> list:
+    """Returns reviews values from data as (rating, text) pairs."""
+    return [(rating, text) for rating, text, time in validate_data_key(data, 'reviews')]
 
 def get_distance_in_miles(location1: list, location2: list) -> float:
     """Returns distance in miles given latitude and longitude."""
@@ -184,17 +182,45 @@ def get_distance_in_miles(location1: list, location2: list) -> float:
 
     return (c * radius_earth)
 
-def get_exact_location(data: dict) -> tuple:
+def get_exact_location(data: Place) -> tuple:
     """Returns geometry.location values from data."""
-    try:
-        geometry = validate_data_key(data, 'geometry.location')
-    except KeyError as error:
-        print(error)
-
-    lat = geometry['lat']
-    lng = geometry['lng']
-
-    return (lat, lng)
+    return (validate_data_key(data, 'lat'), validate_data_key(data, 'lng'))
+
+# Place Details fields each getter reads, used to request only what the enabled analyzers need
+DETAIL_FIELDS = {
+    get_business_status: ['business_status'],
+    get_address: ['formatted_address'],
+    get_phone_number: ['formatted_phone_number'],
+    get_delivery: ['delivery'],
+    get_curbside_pickup: ['curbside_pickup'],
+    get_dine_in: ['dine_in'],
+    get_name: ['name'],
+    get_place_id: ['place_id'],
+    get_rating: ['rating'],
+    get_user_ratings_total: ['user_ratings_total'],
+    get_reservable: ['reservable'],
+    get_meals: ['serves_breakfast', 'serves_lunch', 'serves_brunch', 'serves_dinner'],
+    get_beer: ['serves_beer'],
+    get_types: ['types'],
+    get_website: ['website'],
+    get_wine: ['serves_wine'],
+    get_vegetarian: ['serves_vegetarian_food'],
+    get_price_level: ['price_level'],
+    get_takeout: ['takeout'],
+    get_wheelchair_accessible: ['wheelchair_accessible_entrance'],
+    get_opening_hours: ['opening_hours'],
+    get_reviews: ['reviews'],
+    get_exact_location: ['geometry/location'],
+}
+
+def get_detail_fields(analyzers: list) -> list:
+    """Returns sorted Place Details fields needed by the getters of every analyzer given."""
+    # every run filters on business_status and keys places by place_id
+    fields = {'place_id', 'business_status'}
+    for analyzer in analyzers:
+        for getter in analyzer.getters:
+            fields.update(DETAIL_FIELDS[getter])
+    return sorted(fields)
 
 def get_google_api_key(file: str) -> str:
     """Read text file for Google API key."""
@@ -1,17 +1,21 @@
-import os
-import shutil
-from docx import Document
+from __future__ import annotations
 
-from docx.shared import Inches, RGBColor
-from docx.shared import Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+import io
+from typing import IO, TYPE_CHECKING
 
 import utilities as ut
+from servings import PRICE_LABEL
+
+# python-docx is imported where a document is built so the CLI starts without it
+if TYPE_CHECKING:
+    from docx.document import Document
 
 
 class WriteDocument:
 
     def add_red_line(self, doc: Document) -> None:
+        from docx.shared import RGBColor
+
         word = 2*"____________________________________________________"
         p = doc.add_paragraph()
         runner = p.add_run(word)
@@ -19,29 +23,64 @@ class WriteDocument:
         runner.font.color.rgb = RGBColor(255, 0, 0)
 
     def add_bold(self, doc: Document, word: str, font_size: int) -> None:
+        from docx.shared import Pt
+
         p = doc.add_paragraph()
         runner = p.add_run(word)
         runner.bold = True
         runner.font.size = Pt(font_size)
 
     def add_italic(self, doc: Document, word: str, font_size: int) -> None:
+        from docx.shared import Pt
+
         p = doc.add_paragraph()
         runner = p.add_run(word)
         runner.italic = True
         runner.font.size = Pt(font_size)
 
     def add_regular(self, doc: Document, word: str, font_size: int) -> None:
+        from docx.shared import Pt
+
         p = doc.add_paragraph()
         runner = p.add_run(word)
         runner.font.size = Pt(font_size)
 
+    def add_skipped(self, doc: Document, section: str) -> None:
+        doc.add_paragraph(f'{section}: skipped in the fast tier, needs place details', style='ListBullet')
+
+    def format_serving(self, category: str, value: float | None) -> str:
+        """Formats a servings statistic, a percent of businesses or the average price level."""
+        if value is None:
+            return 'Unknown'
+        if category == PRICE_LABEL:
+            return f'{round(value, 2)}'
+        return f'{round(value, 2)}%'
+
+    def format_ring_stat(self, statistic: str, value: float | None) -> str:
+        """Formats one statistic of a ring, counts as is and the servings like the servings table."""
+        if statistic in ('Businesses', 'Open 24/7'):
+            return str(value)
+        if statistic in ('Average rating (out of 5)', 'Average hours open per week'):
+            return 'Unknown' if value is None else f'{round(value, 2)}'
+        return self.format_serving(statistic, value)
+
+    def format_competition_stat(self, value: float | None) -> str:
+        """Formats one competition statistic, counts as is and measurements to 2 decimals."""
+        if value is None:
+            return 'Unknown'
+        if isinstance(value, int):
+            return str(value)
+        return f'{round(value, 2)}'
+
     def get_min_wage_url_from_place(self, places: str) -> str:
         state = (places.split(", ")[1]).replace(" ", "%20")
         return f'https://www.epi.org/minimum-wage-tracker/#/min_wage/{state}'
 
-    def write_to_document(self, doc_name: str, visual: str, radius: float, business_type: str, place: str, county: str, hours: list,
-                          ratings: list, servings: list, demographics: tuple) -> None:
-        doc = Document()
+    def add_header_section(self, doc: Document, radius: float, business_type: str, place: str, county: str,
+                           business_count: int, tier: str) -> None:
+        from docx.enum.text import WD_ALIGN_PARAGRAPH
+        from docx.shared import Pt, RGBColor
+
         # Add a heading
         word = 'Overview and Statistics of Surrounding Businesses'
         p = doc.add_heading()
@@ -51,18 +90,20 @@ class WriteDocument:
         runner.font.size = Pt(20)
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
-        # HEADER
         self.add_red_line(doc)
         self.add_regular(doc, f'Location: {place}', 10)
         self.add_regular(doc, f'County: {county}', 10)
         self.add_regular(doc, f'Radius: ~{radius} miles', 10)
         self.add_regular(doc, f'Business type: {business_type}', 10)
-        self.add_regular(doc, f'Number of businesses found: {ratings[0][0]}', 10)
+        self.add_regular(doc, f'Number of businesses found: {business_count}', 10)
         min_wage_url = self.get_min_wage_url_from_place(place)
         self.add_regular(doc, f'To track minimum wage for your state: {min_wage_url}', 10)
+        if tier == 'fast':
+            self.add_regular(doc, 'Analysis tier: fast (nearby search results only, some sections are skipped)', 10)
         self.add_red_line(doc)
 
-        # MAP
+    def add_map_section(self, doc: Document, visual: str, density: bytes | None) -> None:
+        from docx.shared import Inches
 
         # only adds picture if visual does not catch an error
         if visual != "1":
@@ -71,13 +112,24 @@ class WriteDocument:
           doc.add_picture(map_path, width=Inches(6), height=Inches(4))
           self.add_red_line(doc)
 
-        # HOURS
+        if density is not None:
+            self.add_bold(doc, 'Competitor Density', 16)
+            self.add_italic(doc, 'Darker areas have more competing businesses close together', 8)
+            doc.add_picture(io.BytesIO(density), width=Inches(5), height=Inches(5))
+            self.add_red_line(doc)
+
+    def add_hours_section(self, doc: Document, hours: list | None) -> None:
+        from docx.shared import Inches
 
         word = 'Hours'
         self.add_bold(doc, word, 16)
         stat_names = ['Places that are open the most (in hours)', 'Places that are open the least (in hours)', 'Average hours open per week',
                       'Days that places are closed the most', 'Earliest open places', 'Latest open places']
 
+        if hours is None:
+            self.add_skipped(doc, 'Hours')
+            hours = []
+
         for name2, stat in zip(stat_names, hours):
             if stat == 0 or len(stat) == 0:
                 self.add_italic(doc, name2, 14)
@@ -105,19 +157,36 @@ class WriteDocument:
                         row_cells[2].text = places
                     doc.add_paragraph()
 
-        self.add_italic(doc, "24/7 places", 14)
+        if hours:
+            self.add_italic(doc, "24/7 places", 14)
 
-        if hours[-1] == []:
-            doc.add_paragraph('No places open 24/7', style='ListBullet')
-        else:
-            for place in hours[-1]:
-                doc.add_paragraph(place, style='ListBullet')
+            if hours[6] == []:
+                doc.add_paragraph('No places open 24/7', style='ListBullet')
+            else:
+                for place in hours[6]:
+                    doc.add_paragraph(place, style='ListBullet')
 
-        self.add_red_line(doc)
-        doc.save(doc_name)
+            self.add_italic(doc, 'Places open across the week', 14)
+            doc.add_picture(io.BytesIO(hours[7]), width=Inches(6), height=Inches(2.4))
 
-        # RATINGS
+            self.add_italic(doc, 'Times no place is open', 14)
+            if hours[8] is None:
+                doc.add_paragraph('No place has known opening hours', style='ListBullet')
+            elif hours[8] == []:
+                doc.add_paragraph('Some place is always open', style='ListBullet')
+            else:
+                table = doc.add_table(rows=0, cols=2)
+                table.autofit = True
+                table.style = 'Table Grid'
+                for start, end in hours[8]:
+                    row_cells = table.add_row().cells
+                    row_cells[0].text = start
+                    row_cells[1].text = end
+                doc.add_paragraph()
 
+        self.add_red_line(doc)
+
+    def add_ratings_section(self, doc: Document, ratings: list) -> None:
         word = 'Ratings:'
 
         self.add_bold(doc, word, 16)
@@ -132,6 +201,8 @@ class WriteDocument:
                 self.add_italic(doc, word, 14)
                 word = str(data[1]) + " stars"
                 doc.add_paragraph(word, style='ListBullet')
+            elif data is None:
+                self.add_skipped(doc, name)
             elif name == 'Bad Ratings and Examples':
                 word = f'-{name} (1-2 stars):'
 
@@ -148,9 +219,8 @@ class WriteDocument:
                     doc.add_paragraph(item, style='ListBullet')
 
         self.add_red_line(doc)
-        doc.save(doc_name)
-        # SERVINGS
 
+    def add_servings_section(self, doc: Document, servings: list) -> None:
         word = 'What Businesses in the Area Serve'
 
         self.add_bold(doc, word, 16)
@@ -163,16 +233,22 @@ class WriteDocument:
                 word = 'Proportion of what Businesses Offer'
 
                 self.add_italic(doc, word, 14)
-                table = doc.add_table(rows=0, cols=2)
+                table = doc.add_table(rows=0, cols=3)
                 table.autofit = True
                 table.style = 'Table Grid'
 
-                for category, percent in data.items():
+                row_cells = table.add_row().cells
+                row_cells[1].text = 'Offered by'
+                row_cells[2].text = 'Known for'
+                for category, (value, known) in data.items():
                     row_cells = table.add_row().cells
                     row_cells[0].text = category
-                    row_cells[1].text = str(percent)
+                    row_cells[1].text = self.format_serving(category, value)
+                    row_cells[2].text = f'{round(known, 2)}%'
 
                 doc.add_paragraph()
+            elif data is None:
+                self.add_skipped(doc, 'Suggestions to Offer')
             else:
 
                 word = 'Suggestions to Offer'
@@ -186,10 +262,45 @@ class WriteDocument:
                     doc.add_paragraph(item, style='ListBullet')
 
         self.add_red_line(doc)
-        doc.save(doc_name)
-        doc.add_page_break()
-        # DEMOGRAPHICS (contains demographics pie charts and migration data)
 
+    def add_rings_section(self, doc: Document, rings: list) -> None:
+        """Same statistics for every catchment, side by side."""
+        self.add_bold(doc, 'Comparison by Distance', 16)
+        self.add_italic(doc, 'Each ring includes every business closer to the location', 8)
+        table = doc.add_table(rows=0, cols=len(rings) + 1)
+        table.autofit = True
+        table.style = 'Table Grid'
+
+        row_cells = table.add_row().cells
+        for cell, (ring, stats) in zip(row_cells[1:], rings):
+            cell.text = f'Within {ring:g} mi'
+        for statistic in rings[0][1]:
+            row_cells = table.add_row().cells
+            row_cells[0].text = statistic
+            for cell, (ring, stats) in zip(row_cells[1:], rings):
+                cell.text = self.format_ring_stat(statistic, stats[statistic])
+
+        doc.add_paragraph()
+        self.add_red_line(doc)
+
+    def add_competition_section(self, doc: Document, competition: dict) -> None:
+        """How close businesses are to the location and to each other."""
+        self.add_bold(doc, 'Competition', 16)
+        self.add_italic(doc, 'Distances are straight lines between businesses with a known location', 8)
+        table = doc.add_table(rows=0, cols=2)
+        table.autofit = True
+        table.style = 'Table Grid'
+        for statistic, value in competition.items():
+            row_cells = table.add_row().cells
+            row_cells[0].text = statistic
+            row_cells[1].text = self.format_competition_stat(value)
+
+        doc.add_paragraph()
+        self.add_red_line(doc)
+
+    def add_demographics_section(self, doc: Document, demographics: tuple) -> None:
+        """Demographics pie charts and migration trends, from PNG bytes."""
+        from docx.shared import Inches
 
         self.add_bold(doc, 'Demographics Data', 16)
         self.add_italic(doc, 'Data from United States Census Bureau reflects available data', 8)
@@ -204,64 +315,56 @@ class WriteDocument:
             for name, data in zip(demographics_names, demographic):
                 if name == "Ethnic":
 
-                    ethnic_dir = data[0]
-                    ethnic_path = data[1]
                     self.add_italic(doc, 'Race', 14)
-                    doc.add_picture(ethnic_path, width=Inches(4), height=Inches(3.2))
-
-                    if os.path.exists(ethnic_dir):
-                        shutil.rmtree(ethnic_dir)
+                    doc.add_picture(io.BytesIO(data), width=Inches(4), height=Inches(3.2))
 
                 elif name == 'Age':
 
-                    age_dir = data[0]
-                    age_path = data[1]
                     self.add_italic(doc, 'Age', 14)
-                    doc.add_picture(age_path, width=Inches(4), height=Inches(3.2))
-
-                    if os.path.exists(age_dir):
-                        shutil.rmtree(age_dir)
+                    doc.add_picture(io.BytesIO(data), width=Inches(4), height=Inches(3.2))
 
                 else:
 
                     doc.add_page_break()
-                    sex_dir = data[0]
-                    sex_path = data[1]
                     self.add_italic(doc, 'Sex', 14)
-                    doc.add_picture(sex_path, width=Inches(4), height=Inches(3.2))
-                    if os.path.exists(sex_dir):
-                        shutil.rmtree(sex_dir)
+                    doc.add_picture(io.BytesIO(data), width=Inches(4), height=Inches(3.2))
 
 
             self.add_red_line(doc)
             doc.add_page_break()
             self.add_bold(doc, 'Migration Trends', 16)
             self.add_italic(doc, 'Data from United States Census Bureau reflects available data between 2010-2021', 8)
+            # domestic, international and net migration charts in that order
             for name, data in zip(migration_names, migration):
-                if name == 'Domestic':
-                    domestic_dir = data[0]
-                    domestic_path = data[1]
-
-                    doc.add_picture(domestic_path, width=Inches(6), height=Inches(4))
-                    if os.path.exists(domestic_dir):
-                        shutil.rmtree(domestic_dir)
-
-                elif name == 'International':
-                    international_dir = data[0]
-                    international_path = data[1]
-
-                    doc.add_picture(international_path, width=Inches(6), height=Inches(4))
-                    if os.path.exists(international_dir):
-                        shutil.rmtree(international_dir)
+                doc.add_picture(io.BytesIO(data), width=Inches(6), height=Inches(4))
 
-                else:
-                    net_dir = data[0]
-                    net_path = data[1]
+        self.add_red_line(doc)
 
-                    doc.add_picture(net_path, width=Inches(6), height=Inches(4))
-                    if os.path.exists(net_dir):
-                        shutil.rmtree(net_dir)
-                        # Add a caption or description
+    def build_document(self, visual: str, radius: float, business_type: str, place: str, county: str, hours: list,
+                       ratings: list, servings: list, demographics: tuple, tier: str = 'full', rings: list = None,
+                       density: bytes = None, competition: dict = None) -> Document:
+        """Assemble the whole report in memory, section by section."""
+        from docx import Document
 
-        self.add_red_line(doc)
+        doc = Document()
+        self.add_header_section(doc, radius, business_type, place, county, ratings[0][0], tier)
+        self.add_map_section(doc, visual, density)
+        self.add_hours_section(doc, hours)
+        self.add_ratings_section(doc, ratings)
+        self.add_servings_section(doc, servings)
+        if competition:
+            self.add_competition_section(doc, competition)
+        if rings:
+            self.add_rings_section(doc, rings)
+        doc.add_page_break()
+        self.add_demographics_section(doc, demographics)
+        return doc
+
+    def write_to_document(self, doc_name: str | IO[bytes], visual: str, radius: float, business_type: str, place: str,
+                          county: str, hours: list, ratings: list, servings: list, demographics: tuple,
+                          tier: str = 'full', rings: list = None, density: bytes = None,
+                          competition: dict = None) -> None:
+        """Build the report and save it once, doc_name is a file path or a binary stream such as io.BytesIO."""
+        doc = self.build_document(visual, radius, business_type, place, county, hours, ratings, servings, demographics,
+                                  tier, rings, density, competition)
         doc.save(doc_name)